@@ -1,3 +1,4 @@
 from .ndbc.ndbc import NDBC
+from .ndbc.async_ndbc import AsyncNDBC
 
 __version__ = "0.0.1"
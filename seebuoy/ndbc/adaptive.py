@@ -0,0 +1,141 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import requests
+
+
+def is_overload_error(error):
+    """Whether an error means NDBC is struggling: a timeout, a dropped
+    connection or a 5xx response."""
+
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+
+    status_code = getattr(error, "status_code", None)
+    return status_code is not None and status_code >= 500
+
+
+class AdaptiveLimit:
+    """Concurrency limit that adapts to how NDBC is responding.
+
+    Works like TCP congestion control (additive increase, multiplicative
+    decrease). While request latency, ideally the time to first byte, stays
+    close to the baseline, the fastest of the last `window` requests, the
+    limit grows by about one request per round of requests. When latency
+    climbs it is eased back, and a timeout or 5xx response halves it.
+
+    Requests waiting for a slot are let through by priority, lowest first,
+    and in arrival order within a priority.
+
+    Args:
+        initial (int): Starting number of requests in flight.
+        min_limit (int): Lowest the limit can go.
+        max_limit (int): Highest the limit can go.
+        tolerance (float): Latency, as a multiple of the baseline, above which
+            requests are considered slowed down.
+        window (int): Number of recent latencies the baseline is taken over.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=16, tolerance=2.0, window=100):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.limit = float(min(max(initial, min_limit), max_limit))
+
+        self.baseline = None
+        self._latencies = deque(maxlen=window)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._tickets = itertools.count()
+
+    def acquire(self, priority=0):
+        with self._cond:
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+
+            try:
+                while self._waiting[0] != ticket or self.in_flight >= int(self.limit):
+                    self._cond.wait()
+            except BaseException:
+                # e.g. KeyboardInterrupt, do not block the requests behind
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+
+            heapq.heappop(self._waiting)
+            self.in_flight += 1
+
+            # the next waiter may fit too
+            self._cond.notify_all()
+
+    def release(self, latency=None, overloaded=False):
+        """Release a slot and adjust the limit from how the request went.
+
+        Args:
+            latency (float): Seconds the request took. None if it failed for
+                a reason unrelated to NDBC's load, which leaves the limit as
+                is.
+            overloaded (bool): The request timed out or got a 5xx.
+        """
+
+        with self._cond:
+            self.in_flight -= 1
+
+            if overloaded:
+                self.limit = max(self.min_limit, self.limit / 2)
+
+            elif latency is not None:
+                # only recent requests count, so the baseline follows the
+                # network rather than one unusually fast response long ago
+                self._latencies.append(latency)
+                self.baseline = min(self._latencies)
+
+                if latency <= self.baseline * self.tolerance:
+                    self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                else:
+                    self.limit = max(self.min_limit, self.limit * 0.9)
+
+            self._cond.notify_all()
+
+    @contextmanager
+    def track(self, priority=0):
+        """Hold a slot for the duration of a request.
+
+        Yields a `Sample` of the request's latency. By default it is the time
+        from taking the slot to the end of the context; call `start` once the
+        request is actually sent, e.g. after waiting for the rate limit, or
+        set `latency` to the time to first byte so reading a large body does
+        not count as NDBC slowing down.
+        """
+
+        self.acquire(priority)
+        sample = Sample()
+        try:
+            yield sample
+        except BaseException as e:
+            self.release(overloaded=is_overload_error(e))
+            raise
+        else:
+            self.release(latency=sample.elapsed())
+
+
+class Sample:
+    """Latency of a single request, as reported to an AdaptiveLimit."""
+
+    def __init__(self):
+        self.latency = None
+        self.start()
+
+    def start(self):
+        """Start timing the request from now."""
+        self._start = time.monotonic()
+
+    def elapsed(self):
+        if self.latency is not None:
+            return self.latency
+        return time.monotonic() - self._start
@@ -0,0 +1,303 @@
+import asyncio
+import functools
+import time
+import pandas as pd
+from . import metadata
+from . import metrics
+from . import real_time
+from . import current_year
+from . import historical
+from . import utils
+from .listing import empty_avail
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+
+class AsyncNDBC:
+    """asyncio interface to the National Data Buoy Center.
+
+    Mirrors `NDBC` but every method is a coroutine, so it can be used inside an
+    event loop without blocking it. Files are downloaded concurrently with
+    aiohttp and parsed in a worker thread using the same parsers as `NDBC`.
+    Requires the optional `aiohttp` package (`pip install seebuoy[async]`).
+
+    Requests are reported to `metrics` and 404s share the negative cache with
+    `NDBC`. They always go to NDBC over aiohttp, so transports (mirrors and
+    fixtures), the disk cache, `configure_rate_limit`, the adaptive limit,
+    retries and the circuit breaker do not apply; concurrency is bounded by
+    `max_workers` only.
+
+    Example:
+        async with AsyncNDBC(timeframe="historical") as ndbc:
+            await ndbc.available_data(station_id="41002")
+            df = await ndbc.get_data("41002")
+    """
+
+    def __init__(self, timeframe="real_time", max_workers=None, session=None):
+        """Initialize AsyncNDBC for a specific time frame.
+
+        Args:
+            timeframe (str): The timeframe for which to pull data. Can be
+                'real_time', 'historical', 'historical_only', 'current_year_only'.
+            max_workers (int): Maximum number of concurrent downloads. Defaults
+                to `utils.MAX_WORKERS`.
+            session (aiohttp.ClientSession): Session to use for requests. If
+                None, one is created on first use and closed by `close`.
+
+        """
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncNDBC requires aiohttp. Install it with "
+                "`pip install seebuoy[async]`."
+            )
+
+        self.timeframe = timeframe
+        self.max_workers = max_workers or utils.MAX_WORKERS
+        self._session = session
+        self._owns_session = session is None
+        self._semaphore = None
+        self._in_flight = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Close the underlying session if it was created by this client."""
+
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit_per_host=utils.POOL_SIZE)
+            timeout = utils.TIMEOUT
+            if isinstance(timeout, tuple):
+                timeout = aiohttp.ClientTimeout(
+                    sock_connect=timeout[0], sock_read=timeout[1]
+                )
+            else:
+                timeout = aiohttp.ClientTimeout(total=timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+        return self._session
+
+    async def _get_url(self, url):
+        """Async counterpart of `utils.get_url`. Concurrent calls for the same
+        url share a single download."""
+
+        task = self._in_flight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_url(url))
+            self._in_flight[url] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(url, None))
+
+        # shield so a cancelled caller does not cancel the other waiters
+        return await asyncio.shield(task)
+
+    async def _fetch_url(self, url):
+
+        missing = utils.missing_urls()
+        if url in missing:
+            return utils.NotFound(url, cached=True)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        with metrics.track(url, cache="bypass") as event:
+            async with self._semaphore:
+                event.sent()
+                sent = time.monotonic()
+                async with self._get_session().get(url) as resp:
+                    event.status_code = resp.status
+                    event.ttfb = time.monotonic() - sent
+                    if resp.status == 200:
+                        body = await resp.read()
+                        event.n_bytes = len(body)
+                        return body.decode(resp.get_encoding(), errors="replace")
+                    elif resp.status == 404:
+                        missing.add(url)
+                        return utils.NotFound(url, resp.status)
+                    else:
+                        retry_after = resp.headers.get("Retry-After")
+                        raise utils.HTTPStatusError(url, resp.status, retry_after)
+
+    async def _gather_urls(self, urls):
+        return await asyncio.gather(*[self._get_url(url) for url in urls])
+
+    async def _run_parser(self, func, *args, **kwargs):
+        """Parse in a worker thread so pandas does not block the event loop."""
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(func, *args, **kwargs)
+        )
+
+    async def stations(self, station_id=None, closest_cities=True, owners=True):
+        """Pull data for all NDBC stations. See `NDBC.stations`."""
+
+        urls = [metadata.LOCATIONS_URL]
+        if owners:
+            urls.append(metadata.OWNERS_URL)
+
+        txts = await self._gather_urls(urls)
+        txt_owners = txts[1] if owners else None
+
+        df = await self._run_parser(
+            metadata.parse_buoy_info,
+            txts[0],
+            txt_owners,
+            closest_cities=closest_cities,
+        )
+
+        self.df_buoys = df
+
+        if station_id:
+            m = df["station_id"] == station_id
+            df = df[m]
+
+        return df
+
+    async def _avail_real_time(self, dataset):
+        txt = await self._get_url(real_time.avail_url())
+
+        # a missing listing, e.g. on a partial mirror, lists no files
+        df = await self._run_parser(real_time.parse_avail_real_time, txt or "")
+
+        if dataset != "all":
+            m = df["dataset"] == dataset
+            df = df[m]
+
+        return df
+
+    async def _avail_current_year(self, dataset):
+        if dataset == "all":
+            datasets = list(current_year.DATASETS)
+        else:
+            datasets = [dataset]
+
+        async def avail(ds):
+            urls = current_year.avail_urls(ds)
+            txts = await self._gather_urls(urls.values())
+            data = dict(zip(urls, txts))
+            return await self._run_parser(
+                current_year.parse_avail_current_year, data, ds
+            )
+
+        df_store = await asyncio.gather(*[avail(ds) for ds in datasets])
+
+        return pd.concat(df_store)
+
+    async def _avail_historical(self, dataset):
+        if dataset == "all":
+            datasets = list(historical.DATASETS)
+        else:
+            datasets = [dataset]
+
+        async def avail(ds):
+            txt = await self._get_url(historical.avail_url(ds))
+            if not txt:
+                return None
+            return await self._run_parser(historical.parse_avail_historical, txt, ds)
+
+        df_store = await asyncio.gather(*[avail(ds) for ds in datasets])
+        df_store = [df for df in df_store if df is not None]
+
+        if not df_store:
+            return empty_avail()
+
+        return pd.concat(df_store)
+
+    async def available_data(self, dataset="standard", station_id=None):
+        """Lists the available data for the given parameters. See
+        `NDBC.available_data`."""
+
+        if self.timeframe == "historical":
+            df_store = await asyncio.gather(
+                self._avail_real_time(dataset),
+                self._avail_current_year(dataset),
+                self._avail_historical(dataset),
+            )
+            df = pd.concat(df_store)
+
+        elif self.timeframe == "real_time":
+            df = await self._avail_real_time(dataset)
+
+        elif self.timeframe == "current_year_only":
+            df = await self._avail_current_year(dataset)
+
+        elif self.timeframe == "historical_only":
+            df = await self._avail_historical(dataset)
+
+        else:
+            raise ValueError(
+                "self.timeframe must be 'all', 'real_time', 'current_year', or 'historical'"
+            )
+
+        self.df_avail = df
+
+        if station_id is not None:
+            m = df["station_id"] == station_id
+            df = df[m].copy()
+
+        return df
+
+    async def _get_file(self, row, rename_cols=True):
+        timeframe = row["timeframe"]
+        dataset = row["dataset"]
+
+        if timeframe == "real_time":
+            parse_dataset = real_time.parse_dataset
+
+        elif timeframe == "current_year":
+            parse_dataset = current_year.parse_dataset
+
+        elif timeframe == "historical":
+            parse_dataset = historical.parse_dataset
+
+        else:
+            raise ValueError("timeframe is not real_time, current_year, or historical.")
+
+        txt = await self._get_url(row["txt_url"])
+        if not txt:
+            return None
+
+        return await self._run_parser(
+            parse_dataset, txt, dataset, rename_cols=rename_cols
+        )
+
+    async def get_data(
+        self,
+        station_id,
+        dataset="standard",
+        rename_cols=True,
+        drop_duplicates=True,
+    ):
+        """Pull data for a single station. See `NDBC.get_data`."""
+
+        m1 = self.df_avail["station_id"] == station_id
+        m2 = self.df_avail["dataset"] == dataset
+        df_avail = self.df_avail[m1 & m2]
+
+        rows = df_avail.to_dict(orient="records")
+        df_store = await asyncio.gather(
+            *[self._get_file(row, rename_cols=rename_cols) for row in rows]
+        )
+
+        df_store = [df for df in df_store if df is not None]
+
+        if not df_store:
+            return pd.DataFrame()
+
+        df = pd.concat(df_store)
+
+        if drop_duplicates:
+            df = df[~df.index.duplicated(keep="first")]
+
+        return df.sort_index()
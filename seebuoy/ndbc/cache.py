@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from .ratelimit import _file_lock
+
+# yearly historical files, raw or through the text viewer, are published once
+# and never change. The listings of data/historical/ do, new years are added.
+IMMUTABLE_PATTERNS = (
+    re.compile(r"/data/historical/[^/]+/[^/?]+\.txt\.gz$"),
+    re.compile(r"\?filename=[^&/]+\.txt\.gz&dir=data/historical/[^/&]+/$"),
+)
+
+
+def is_immutable(url):
+    """Whether the file behind `url` can be cached forever."""
+    return any(pattern.search(url) for pattern in IMMUTABLE_PATTERNS)
+
+
+def _write_atomic(path, data):
+    """Write to a temp file and move it into place so readers never see a
+    partially written file."""
+
+    dir_name = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=dir_name, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class CacheEntry:
+    """A cached response body along with its validators."""
+
+    def __init__(
+        self,
+        url,
+        body,
+        etag=None,
+        last_modified=None,
+        fetched_at=0.0,
+        encoding=None,
+        content_length=None,
+    ):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.encoding = encoding
+        self.content_length = content_length
+
+    @property
+    def text(self):
+        return self.body.decode(self.encoding or "utf-8", errors="replace")
+
+    def validators(self):
+        """Headers for a conditional GET against this entry."""
+
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def unchanged(self, headers):
+        """Whether the Last-Modified and Content-Length `headers` of a HEAD
+        request match this entry. False if either is unknown."""
+
+        last_modified = headers.get("Last-Modified")
+        content_length = headers.get("Content-Length")
+
+        return (
+            last_modified is not None
+            and content_length is not None
+            and last_modified == self.last_modified
+            and content_length == self.content_length
+        )
+
+    def meta(self):
+        return {
+            "url": self.url,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "fetched_at": self.fetched_at,
+            "encoding": self.encoding,
+            "content_length": self.content_length,
+        }
+
+
+class DiskCache:
+    """On-disk HTTP cache keyed by URL.
+
+    Each response is stored as two files, the raw body and a small json file
+    holding the ETag/Last-Modified validators and the time it was fetched.
+
+    Args:
+        cache_dir (str): Directory in which to store the responses.
+        ttl (float): Seconds a response is served without asking NDBC. Once
+            expired it is revalidated with a conditional GET. Immutable
+            historical files are never revalidated.
+    """
+
+    def __init__(self, cache_dir, ttl=3600):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.ttl = ttl
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f"{base}.body", f"{base}.json"
+
+    def load(self, url):
+        body_path, meta_path = self._paths(url)
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+
+        return CacheEntry(body=body, **meta)
+
+    def is_fresh(self, entry):
+        if is_immutable(entry.url):
+            return True
+        return time.time() - entry.fetched_at < self.ttl
+
+    def store(self, url, body, headers=None, encoding=None):
+        headers = headers or {}
+        entry = CacheEntry(
+            url,
+            body,
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+            fetched_at=time.time(),
+            encoding=encoding,
+            content_length=headers.get("Content-Length"),
+        )
+
+        body_path, meta_path = self._paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        _write_atomic(body_path, body)
+        _write_atomic(meta_path, json.dumps(entry.meta()).encode())
+
+        return entry
+
+    def touch(self, entry):
+        """Mark an entry as revalidated (e.g. after a 304)."""
+
+        entry.fetched_at = time.time()
+        _, meta_path = self._paths(entry.url)
+        _write_atomic(meta_path, json.dumps(entry.meta()).encode())
+
+        return entry
+
+
+class NegativeCache:
+    """Remembers urls that returned 404 so they are not requested again.
+
+    Entries expire after `ttl` seconds since files do get added to NDBC (a new
+    month of data for example). With `path` set, the entries are also appended
+    to a file, one json line per url, and shared with other processes and
+    later runs. Writes take the same file lock as `RateLimiter`.
+
+    Args:
+        ttl (float): Seconds a url is considered missing.
+        path (str): Optional file in which to persist the entries.
+    """
+
+    def __init__(self, ttl=3600, path=None):
+        self.ttl = ttl
+        self.path = os.path.expanduser(path) if path else None
+        self._lock = threading.Lock()
+        self._missing = {}
+
+        if self.path and os.path.exists(self.path):
+            self._load()
+
+    def __contains__(self, url):
+        with self._lock:
+            checked_at = self._missing.get(url)
+            if checked_at is None:
+                return False
+            if time.time() - checked_at < self.ttl:
+                return True
+            del self._missing[url]
+            return False
+
+    def add(self, url):
+        with self._lock:
+            checked_at = self._missing[url] = time.time()
+            self._append(url, checked_at)
+
+    def discard(self, url):
+        with self._lock:
+            if self._missing.pop(url, None) is not None:
+                self._append(url, None)
+
+    def clear(self):
+        with self._lock:
+            self._missing = {}
+            if self.path and os.path.exists(self.path):
+                with _file_lock(self.path) as f:
+                    f.truncate(0)
+
+    def _load(self):
+        """Read the entries back, then drop expired and superseded lines."""
+
+        with _file_lock(self.path) as f:
+            f.seek(0)
+            lines = f.readlines()
+
+            now = time.time()
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                    url, checked_at = entry["url"], entry["time"]
+                except (ValueError, TypeError, KeyError):
+                    # e.g. a line cut short by a crash
+                    continue
+                if checked_at is None or now - checked_at >= self.ttl:
+                    self._missing.pop(url, None)
+                else:
+                    self._missing[url] = checked_at
+
+            if len(lines) > len(self._missing):
+                f.truncate(0)
+                f.writelines(
+                    json.dumps({"url": url, "time": checked_at}) + "\n"
+                    for url, checked_at in self._missing.items()
+                )
+
+    def _append(self, url, checked_at):
+        """Append an entry, None marking the url as no longer missing."""
+
+        if not self.path:
+            return
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with _file_lock(self.path) as f:
+            f.write(json.dumps({"url": url, "time": checked_at}) + "\n")
@@ -0,0 +1,269 @@
+"""Local catalog of the files NDBC publishes.
+
+`available_data` has to download and parse NDBC's directory listings, a few
+hundred pages with tens of thousands of rows for `dataset="all"`. The
+catalog keeps the result in a SQLite database, indexed on station, dataset,
+timeframe and year, so later lookups are answered locally in milliseconds.
+
+Only a few listings change during the day (realtime2 and the current month's
+folders). Once the catalog is older than its ttl those are downloaded again
+and their rows merged in by last_modified and size. Every listing, including
+the historical ones, is only downloaded again once older than `full_ttl`.
+Stale catalogs are refreshed in a background thread while the stored rows
+keep being served.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import warnings
+import pandas as pd
+from .listing import AVAIL_COLUMNS as COLUMNS
+
+FILE_NAME = "catalog.sqlite"
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_name TEXT,
+    last_modified TEXT,
+    size TEXT,
+    description TEXT,
+    station_id TEXT,
+    file_year INTEGER,
+    dataset_code TEXT,
+    dataset TEXT,
+    timeframe TEXT,
+    url TEXT,
+    txt_url TEXT,
+    gz_url TEXT
+);
+CREATE INDEX IF NOT EXISTS files_lookup
+    ON files (station_id, dataset, timeframe, file_year);
+CREATE INDEX IF NOT EXISTS files_timeframe ON files (timeframe, dataset);
+CREATE INDEX IF NOT EXISTS files_url ON files (timeframe, url);
+CREATE TABLE IF NOT EXISTS refreshed (
+    timeframe TEXT,
+    dataset TEXT,
+    refreshed_at REAL,
+    full_refreshed_at REAL,
+    PRIMARY KEY (timeframe, dataset)
+);
+"""
+
+
+class Catalog:
+    """SQLite store of the rows `available_data` produces.
+
+    Rows are stored per timeframe (real_time, current_year, historical) and
+    dataset, along with the time they were downloaded.
+
+    Args:
+        path (str): Directory holding the catalog, e.g. the disk cache
+            directory. It is created if needed.
+        ttl (float): Seconds after which the listings that can change are
+            downloaded again.
+        full_ttl (float): Seconds after which every listing is downloaded
+            again.
+    """
+
+    def __init__(self, path, ttl=3600, full_ttl=7 * 24 * 3600):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.full_ttl = full_ttl
+        os.makedirs(self.path, exist_ok=True)
+        self.db_path = os.path.join(self.path, FILE_NAME)
+
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        # a connection per call, so the catalog can be used from any thread
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def refreshed_at(self, timeframe, dataset):
+        """When the rows for a timeframe and dataset were last refreshed, and
+        last fully refreshed, counting refreshes of all datasets. (None, None)
+        if they never were."""
+
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT MAX(refreshed_at), MAX(full_refreshed_at) FROM refreshed "
+                "WHERE timeframe = ? AND dataset IN (?, 'all')",
+                (timeframe, dataset),
+            ).fetchone()
+
+    def store(self, timeframe, dataset, df, prefixes=None):
+        """Merge freshly downloaded rows into the catalog.
+
+        Rows are matched on their url. New rows and rows whose last_modified
+        or size changed are written, rows no longer listed are removed and
+        the rest are left as they are.
+
+        Args:
+            timeframe (str): real_time, current_year or historical.
+            dataset (str): Name of the dataset, or "all".
+            df (pd.DataFrame): Rows from the downloaded listings.
+            prefixes (list): Url prefixes of the listings that were
+                downloaded, e.g. ["stdmet/Oct/"]. Rows outside them are kept.
+                None if every listing of the timeframe was downloaded.
+
+        Returns:
+            Number of rows added, changed or removed.
+        """
+
+        df = df.reindex(columns=COLUMNS).assign(timeframe=timeframe)
+        df = df.astype(object).where(df.notna(), None)
+        rows = {row.url: row for row in df.itertuples(index=False)}
+
+        scope = "timeframe = ?"
+        params = [timeframe]
+        if dataset != "all":
+            scope += " AND dataset = ?"
+            params.append(dataset)
+        if prefixes is not None:
+            scope += " AND (" + " OR ".join(["url LIKE ?"] * len(prefixes)) + ")"
+            params.extend(prefix + "%" for prefix in prefixes)
+
+        _, full_refreshed_at = self.refreshed_at(timeframe, dataset)
+        now = time.time()
+        if prefixes is None:
+            full_refreshed_at = now
+
+        with self._connect() as conn:
+            stored = conn.execute(
+                f"SELECT url, last_modified, size FROM files WHERE {scope}", params
+            ).fetchall()
+            stored = {url: (last_modified, size) for url, last_modified, size in stored}
+
+            removed = [url for url in stored if url not in rows]
+            changed = [
+                row
+                for url, row in rows.items()
+                if stored.get(url) != (row.last_modified, row.size)
+            ]
+
+            conn.executemany(
+                "DELETE FROM files WHERE timeframe = ? AND url = ?",
+                [(timeframe, url) for url in removed]
+                + [(timeframe, row.url) for row in changed],
+            )
+            placeholders = ", ".join("?" * len(COLUMNS))
+            conn.executemany(
+                f"INSERT INTO files ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                [tuple(row) for row in changed],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO refreshed VALUES (?, ?, ?, ?)",
+                (timeframe, dataset, now, full_refreshed_at),
+            )
+
+        return len(removed) + len(changed)
+
+    def load(self, timeframe, dataset, station_id=None):
+        """Stored rows for a timeframe and dataset ("all" for every
+        dataset), optionally for a single station."""
+
+        query = f"SELECT {', '.join(COLUMNS)} FROM files WHERE timeframe = ?"
+        params = [timeframe]
+
+        if dataset != "all":
+            query += " AND dataset = ?"
+            params.append(dataset)
+        if station_id is not None:
+            query += " AND station_id = ?"
+            params.append(station_id)
+
+        with self._connect() as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+
+        df["file_year"] = df["file_year"].astype("Int64")
+        return df
+
+    def is_stale(self, timeframe, dataset, incremental=True):
+        """Whether the rows should be refreshed. Without a way to refresh
+        them incrementally only `full_ttl` applies."""
+
+        refreshed_at, full_refreshed_at = self.refreshed_at(timeframe, dataset)
+        if refreshed_at is None:
+            return True
+
+        now = time.time()
+        if now - full_refreshed_at > self.full_ttl:
+            return True
+
+        return incremental and now - refreshed_at > self.ttl
+
+    def refresh(self, timeframe, dataset, fetch, fetch_changed=None):
+        """Bring the rows of a timeframe and dataset up to date, if stale.
+
+        Args:
+            timeframe (str): real_time, current_year or historical.
+            dataset (str): Name of the dataset, or "all".
+            fetch (callable): Downloads every listing and returns the rows
+                as a dataframe, e.g. a call to `historical.avail_historical`.
+            fetch_changed (callable): Called with the time of the last
+                refresh, downloads only the listings that may have changed
+                since and returns their rows and url prefixes, as passed to
+                `store`. None if the timeframe is only refreshed in full.
+
+        Returns:
+            Number of rows added, changed or removed.
+        """
+
+        if not self.is_stale(timeframe, dataset, fetch_changed is not None):
+            return 0
+
+        refreshed_at, full_refreshed_at = self.refreshed_at(timeframe, dataset)
+
+        if refreshed_at is None or time.time() - full_refreshed_at > self.full_ttl:
+            return self.store(timeframe, dataset, fetch())
+
+        df, prefixes = fetch_changed(refreshed_at)
+        return self.store(timeframe, dataset, df, prefixes=prefixes)
+
+    def get(self, timeframe, dataset, fetch, fetch_changed=None, station_id=None):
+        """Rows for a timeframe and dataset, downloading them with `fetch`
+        the first time. Stale rows are returned as they are and refreshed in
+        the background. See `refresh` for the arguments.
+
+        Args:
+            station_id (str): Only return the rows of this station.
+        """
+
+        if self.refreshed_at(timeframe, dataset)[0] is None:
+            self.refresh(timeframe, dataset, fetch)
+        elif self.is_stale(timeframe, dataset, fetch_changed is not None):
+            self.refresh_in_background(timeframe, dataset, fetch, fetch_changed)
+
+        return self.load(timeframe, dataset, station_id)
+
+    def refresh_in_background(self, timeframe, dataset, fetch, fetch_changed=None):
+        """Run `refresh` in a daemon thread. Stored rows keep being served
+        until it is done, and if it fails a warning is issued."""
+
+        key = (timeframe, dataset)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.refresh(timeframe, dataset, fetch, fetch_changed)
+            except Exception as e:
+                warnings.warn(
+                    f"Failed to refresh the {timeframe} {dataset} catalog: {e!r}",
+                    RuntimeWarning,
+                )
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        thread = threading.Thread(target=refresh, daemon=True)
+        thread.start()
+        return thread
@@ -2,6 +2,7 @@ from datetime import datetime
 import pandas as pd
 from . import historical
 from . import utils
+from .listing import empty_avail, listing_from_headers, parse_listing
 
 
 DATASETS = {
@@ -41,69 +42,155 @@ MONTHS = {
     "Dec": 12,
 }
 
+# month in gzipped file names, 4101312023.txt.gz is January 2023
+MONTH_CODES = "123456789abc"
+
+# the current year is fetched after realtime and ahead of historical backfills
+PRIORITY = utils.PRIORITY_NORMAL
+
+# months in a row without a file after which older months are not probed
+MAX_MISSES = 3
+
 # EXTRACT
 
 
-def extract_avail_current_year(dataset):
+def avail_urls(dataset, months=None):
+    """Urls of the monthly listings for the dataset, keyed by month. All
+    months unless `months` is given."""
 
     dataset_code = DATASETS[dataset]
+    months = MONTHS if months is None else months
+
+    return {month: f"{utils.BASE_URL}/{dataset_code}/{month}" for month in months}
+
+
+def extract_avail_current_year(
+    datasets, transport=None, refresh=None, max_workers=None, months=None
+):
+    """Download the monthly listings of one or more datasets at once, or
+    only those of `months` (names as in MONTHS).
+
+    Returns:
+        Dict of {dataset: {month: txt}}, in the order of `datasets` and
+        MONTHS. Just {month: txt} if a single dataset name is passed.
+    """
+
+    single = isinstance(datasets, str)
+    if single:
+        datasets = [datasets]
+
+    keys = [
+        (ds, month, url)
+        for ds in datasets
+        for month, url in avail_urls(ds, months=months).items()
+    ]
+
+    def fetch(key):
+        return utils.get_url(
+            key[2], transport=transport, refresh=refresh, priority=PRIORITY
+        )
+
+    txts = utils.map_concurrent(fetch, keys, max_workers=max_workers)
+
+    data = {ds: {} for ds in datasets}
+    for (ds, month, _), txt in zip(keys, txts):
+        data[ds][month] = txt
+
+    return data[datasets[0]] if single else data
 
-    data = {}
-    for month in MONTHS:
 
-        url = f"{utils.BASE_URL}/{dataset_code}/{month}"
-        txt = utils.get_url(url)
-        data[month] = txt
+def changed_months(since, now=None):
+    """Names of the monthly folders that may have changed since `since` (a
+    datetime in UTC): from the month before it, whose files are gzipped a few
+    days into the next month, to the current one. In January that is last
+    year's December folder. None if `since` is in an earlier year, when every
+    folder changes."""
 
-    return data
+    now = datetime.utcnow() if now is None else now
+    if since.year != now.year:
+        return None
+
+    names = list(MONTHS)
+    months = names[max(since.month - 2, 0) : now.month]
+    if since.month == 1:
+        months = [names[-1]] + months
+    return months
+
+
+def station_urls(station_id, dataset, now=None):
+    """Urls the current year files of a station would have, keyed by month.
+
+    The current month is a plain text file, 41013.txt, and earlier months
+    are gzipped, 4101312023.txt.gz. Last month's file is gzipped a few days
+    into the month so both names are included. Folders of the months still
+    to come hold last year's files until NDBC moves them to historical.
+    """
+
+    now = datetime.utcnow() if now is None else now
+    dataset_code = DATASETS[dataset]
+    last_month = (now.month - 2) % 12 + 1
+
+    urls = {}
+    for month, number in MONTHS.items():
+        year = now.year if number <= now.month else now.year - 1
+        gz_name = f"{station_id}{MONTH_CODES[number - 1]}{year}.txt.gz"
+
+        if number == now.month:
+            names = [f"{station_id}.txt"]
+        elif number == last_month:
+            names = [gz_name, f"{station_id}.txt"]
+        else:
+            names = [gz_name]
+
+        urls[month] = [f"{utils.BASE_URL}/{dataset_code}/{month}/{n}" for n in names]
+
+    return urls
 
 
 # TRANSFORM
 
 
 def _build_txt_url(file_name, dataset_code, month):
-    base_url = "https://www.ndbc.noaa.gov/view_text_file.php?filename"
-    url = f"{base_url}={file_name}&dir=data/{dataset_code}/{month}/"
+    """Url of a file in NDBC's text viewer. `file_name` can be a string or a
+    Series of them."""
 
-    return url
+    base_url = f"{utils.VIEW_TEXT_URL}?filename="
+    return base_url + file_name + f"&dir=data/{dataset_code}/{month}/"
 
 
 def parse_avail_current_year_month(txt, dataset, month):
 
-    dataset_code = DATASETS[dataset]
+    return build_avail_current_year_month(parse_listing(txt), dataset, month)
+
 
-    df = pd.read_html(txt)[0]
-    col_rename = {
-        "Name": "file_name",
-        "Last modified": "last_modified",
-        "Size": "size",
-        "Description": "description",
-    }
-    df = pd.read_html(txt)[0]
-    df = df.dropna(subset="Last modified")
-    df = df[list(col_rename)].rename(columns=col_rename)
+def build_avail_current_year_month(df, dataset, month):
+    """Add the station and urls to the rows of a monthly listing."""
+
+    dataset_code = DATASETS[dataset]
 
     if not len(df):
         return df
 
+    file_name = df["file_name"]
+    stem = file_name.str.split(".", n=1).str[0]
+
     df["dataset_code"] = dataset_code
     df["dataset"] = dataset
-    df["url"] = f"{dataset_code}/{month}/" + df["file_name"]
+    df["url"] = f"{dataset_code}/{month}/" + file_name
+    raw_url = utils.BASE_URL + "/" + df["url"]
+
     # if in the current month, the files will not be gzipped and will
     # have a .txt extension instead of .txt.gz
-    file_extension = df["file_name"].str.split(".").str[-1].iloc[0]
+    is_txt = file_name.str.endswith(".txt")
 
-    if file_extension == "txt":
-        df["station_id"] = df["file_name"].str.split(".").str[0]
-        df["txt_url"] = utils.BASE_URL + "/" + df["url"]
+    # otherwise they put month and year at the end: 4103712022.txt.gz
+    df["station_id"] = stem.where(is_txt, stem.str[:-5])
+    df["txt_url"] = raw_url.where(
+        is_txt, _build_txt_url(file_name, dataset_code, month)
+    )
+    if not is_txt.all():
+        df["gz_url"] = raw_url.mask(is_txt)
 
-    else:
-        # they put year at the end: 4103712022.txt.gz
-        df["station_id"] = df["file_name"].str.split(".").str[0].str[:-5]
-        df["txt_url"] = df.apply(
-            lambda row: _build_txt_url(row["file_name"], dataset_code, month),
-            axis=1,
-        )
     df["timeframe"] = "current_year"
     return df
 
@@ -113,35 +200,101 @@ def parse_avail_current_year(data, dataset):
     df_store = []
     for month, txt in data.items():
 
+        # some datasets do not have a folder for every month
+        if not txt:
+            continue
+
         df = parse_avail_current_year_month(txt, dataset, month)
 
         df_store.append(df)
 
+    if not df_store:
+        return empty_avail()
+
     return pd.concat(df_store)
 
 
 # MAIN INTERFACE
 
 
-def avail_current_year(dataset="standard"):
+def avail_current_year(
+    dataset="standard", transport=None, refresh=None, max_workers=None, months=None
+):
 
     if dataset == "all":
         datasets = list(DATASETS)
     else:
         datasets = [dataset]
 
+    # every month of every dataset is fetched concurrently
+    data = extract_avail_current_year(
+        datasets,
+        transport=transport,
+        refresh=refresh,
+        max_workers=max_workers,
+        months=months,
+    )
+
     df_store = []
     for ds in datasets:
-        data = extract_avail_current_year(ds)
-        df = parse_avail_current_year(data, ds)
+        df = parse_avail_current_year(data[ds], ds)
         df_store.append(df)
 
     return pd.concat(df_store)
 
 
-def get_dataset(txt_url, dataset, rename_cols=True):
+def avail_station_current_year(
+    station_id,
+    dataset="standard",
+    transport=None,
+    max_workers=None,
+    now=None,
+    max_misses=MAX_MISSES,
+):
+    """Current year files of a single station, found with a HEAD request per
+    candidate file instead of downloading the monthly listings.
+
+    Months are checked newest first, and older months are skipped once
+    `max_misses` months in a row had no file. Pass None to check every
+    month.
+    """
+
+    if dataset == "all":
+        datasets = list(DATASETS)
+    else:
+        datasets = [dataset]
+
+    now = datetime.utcnow() if now is None else now
+    urls = {ds: station_urls(station_id, ds, now=now) for ds in datasets}
+
+    # this year's months back to January, then last year's still to move
+    names = list(MONTHS)
+    newest_first = names[now.month - 1 :: -1] + names[: now.month - 1 : -1]
+
+    groups = {ds: [urls[ds][month] for month in newest_first] for ds in datasets}
+    found = utils.head_until_missing(
+        groups,
+        max_misses=max_misses,
+        transport=transport,
+        priority=PRIORITY,
+        max_workers=max_workers,
+    )
+
+    df_store = []
+    for ds in datasets:
+        for month, month_urls in urls[ds].items():
+            headers = [found.get(url) for url in month_urls]
+            df = listing_from_headers(month_urls, headers)
+            if len(df):
+                df_store.append(build_avail_current_year_month(df, ds, month))
 
-    txt = utils.get_url(txt_url)
+    if not df_store:
+        return empty_avail()
+
+    return pd.concat(df_store)
+
+
+def parse_dataset(txt, dataset, rename_cols=True):
 
     if dataset == "standard":
         df = historical.parse_standard(txt, rename_cols=rename_cols)
@@ -173,3 +326,19 @@ def get_dataset(txt_url, dataset, rename_cols=True):
         raise ValueError(f"Dataset must be one of {list(DATASETS)}.")
 
     return df
+
+
+def get_dataset(
+    txt_url, dataset, rename_cols=True, gz_url=None, transport=None, refresh=None
+):
+    def parse(txt):
+        return parse_dataset(txt, dataset, rename_cols=rename_cols)
+
+    return historical.read_file(
+        txt_url,
+        parse,
+        gz_url=gz_url,
+        transport=transport,
+        refresh=refresh,
+        priority=PRIORITY,
+    )
@@ -1,6 +1,12 @@
+import zlib
+from datetime import datetime
 from io import StringIO
+import numpy as np
 import pandas as pd
+import requests
+from . import metrics
 from . import utils
+from .listing import empty_avail, listing_from_headers, parse_listing
 
 DATASETS = {
     "adcp": "adcp",
@@ -64,65 +70,118 @@ SUPPLEMENTAL_MAP = {
     "wtime": "wind_time",
 }
 
+# letter between the station and the year in file names, 41013h2020.txt.gz
+FILE_LETTERS = {
+    "standard": "h",
+    "continuous_wind": "c",
+    "oceanographic": "o",
+    "raw_spectral": "w",
+    "spectral_alpha1": "d",
+    "spectral_alpha2": "i",
+    "spectral_r1": "j",
+    "spectral_r2": "k",
+    "supplemental": "s",
+    "solar_radiation": "r",
+    "water_col_height": "t",
+}
+
+# first year of data NDBC publishes
+FIRST_YEAR = 1970
+
+# years in a row without a file after which older years are not probed
+MAX_MISSES = 10
+
+# backfills wait behind realtime polling for a connection
+PRIORITY = utils.PRIORITY_LOW
+
 
 # EXTRACT
 
 
-def extract_avail_historical(dataset):
+def avail_url(dataset):
 
     dataset_code = DATASETS[dataset]
 
     base_url = f"{utils.BASE_URL}/historical"
-    url = f"{base_url}/{dataset_code}"
-    txt = utils.get_url(url)
+    return f"{base_url}/{dataset_code}"
+
+
+def extract_avail_historical(dataset, transport=None):
+
+    txt = utils.get_url(avail_url(dataset), transport=transport, priority=PRIORITY)
 
     return txt
 
 
+def station_urls(station_id, dataset, years=None):
+    """Urls the historical files of a station would have, one per year. All
+    years from FIRST_YEAR to last year unless `years` is given."""
+
+    if dataset not in FILE_LETTERS:
+        raise ValueError(f"File names of the {dataset} dataset are not known.")
+
+    if years is None:
+        years = range(FIRST_YEAR, datetime.utcnow().year)
+
+    letter = FILE_LETTERS[dataset]
+    return [f"{avail_url(dataset)}/{station_id}{letter}{year}.txt.gz" for year in years]
+
+
 # TRANSFORM
 
 
 def _build_txt_url(name, suffix):
-    base_url = "https://www.ndbc.noaa.gov/view_text_file.php?filename"
-    url = f"{base_url}={name}&dir=data/historical/{suffix}/"
+    """Url of a file in NDBC's text viewer. `name` can be a string or a
+    Series of them."""
 
-    return url
+    base_url = f"{utils.VIEW_TEXT_URL}?filename="
+    return base_url + name + f"&dir=data/historical/{suffix}/"
 
 
 def parse_avail_historical(txt, dataset):
-    dataset_code = DATASETS[dataset]
 
-    df_raw = pd.read_html(txt)[0]
+    return build_avail_historical(parse_listing(txt), dataset)
 
-    df = df_raw.dropna(subset=["Last modified"])
-    col_rename = {
-        "Name": "file_name",
-        "Last modified": "last_modified",
-        "Size": "size",
-        "Description": "description",
-    }
-    df = df[list(col_rename)].rename(columns=col_rename)
+
+def build_avail_historical(df, dataset):
+    """Add the station, year and urls to the rows of a historical listing."""
+
+    dataset_code = DATASETS[dataset]
+    file_name = df["file_name"]
 
     # Example file name: 42007h1989.txt.gz
-    df["station_id"] = df["file_name"].str.split(".").str[0].str[:-5]
-    df["file_year"] = df["file_name"].str.split(".").str[0].str[-4:]
+    stem = file_name.str.split(".", n=1).str[0]
+    df["station_id"] = stem.str[:-5]
+    df["file_year"] = pd.to_numeric(stem.str[-4:], errors="coerce").astype("Int64")
+
+    df["url"] = f"historical/{dataset_code}/" + file_name
 
-    df["url"] = f"historical/{dataset_code}/" + df["file_name"]
-    df["dataset_code"] = dataset_code
-    df["dataset"] = dataset
-    df["timeframe"] = "historical"
+    # the same for every row, so stored as categories
+    codes = np.zeros(len(df), dtype="int8")
+    df["dataset_code"] = pd.Categorical.from_codes(codes, [dataset_code])
+    df["dataset"] = pd.Categorical.from_codes(codes, [dataset])
+    df["timeframe"] = pd.Categorical.from_codes(codes, ["historical"])
 
     # https://www.ndbc.noaa.gov/view_text_file.php?filename=41037h2005.txt.gz&dir=data/historical/stdmet/
-    df["txt_url"] = df.apply(
-        lambda row: _build_txt_url(row["file_name"], row["dataset_code"]), axis=1
-    )
+    df["txt_url"] = _build_txt_url(file_name, dataset_code)
+
+    # the raw gzipped file, a fraction of the size of the viewer's text
+    df["gz_url"] = utils.BASE_URL + "/" + df["url"]
 
     return df
 
 
+def _as_buffer(txt):
+    """Parsers take the text of a file or a file object streaming it."""
+
+    if isinstance(txt, str):
+        return StringIO(txt)
+    return txt
+
+
 def base_parser(txt):
     df = pd.read_csv(
-        StringIO(txt),
+        _as_buffer(txt),
         header=0,
         delim_whitespace=True,
         dtype=str,
@@ -223,7 +282,7 @@ def parse_spectral_r2(txt):
 def parse_tide(txt):
 
     df = pd.read_csv(
-        StringIO(txt),
+        _as_buffer(txt),
         header=0,
         delim_whitespace=True,
         na_values=[99, 999, 9999, 99.0, 99.00, 999.0, 9999.0, "99", "99.0", "99.00"],
@@ -254,7 +313,7 @@ def parse_tide(txt):
 # MAIN INTERFACE
 
 
-def avail_historical(dataset):
+def avail_historical(dataset, transport=None, max_workers=None):
     """
     adcp [adcp]: Acoustic Doppler Current Profiler Current Year Historical Data [adcp]
     adcp2 [adcp2]: Acoustic Doppler Current Profiler Current Year Historical Data [adcp2]
@@ -281,19 +340,69 @@ def avail_historical(dataset):
     else:
         datasets = [dataset]
 
+    def fetch(ds):
+        return extract_avail_historical(ds, transport=transport)
+
+    txts = utils.map_concurrent(fetch, datasets, max_workers=max_workers)
+
     df_store = []
-    for ds in datasets:
+    for ds, txt in zip(datasets, txts):
+
+        if not txt:
+            continue
 
-        txt = extract_avail_historical(ds)
         df = parse_avail_historical(txt, ds)
         df_store.append(df)
 
+    if not df_store:
+        return empty_avail()
+
     return pd.concat(df_store)
 
 
-def get_dataset(txt_url, dataset, rename_cols=True):
+def avail_station_historical(
+    station_id,
+    dataset="standard",
+    transport=None,
+    max_workers=None,
+    years=None,
+    max_misses=MAX_MISSES,
+):
+    """Historical files of a single station, found with a HEAD request per
+    year instead of downloading the listings. With "all", only the datasets
+    in FILE_LETTERS are checked.
+
+    Years are checked newest first, and older years are skipped once
+    `max_misses` years in a row had no file. Pass None to check every year,
+    e.g. for a station retired long ago.
+    """
+
+    if dataset == "all":
+        datasets = list(FILE_LETTERS)
+    else:
+        datasets = [dataset]
+
+    urls = {ds: station_urls(station_id, ds, years=years) for ds in datasets}
+
+    # station_urls are oldest first, one per year
+    groups = {ds: [[url] for url in reversed(urls[ds])] for ds in datasets}
+    found = utils.head_until_missing(
+        groups,
+        max_misses=max_misses,
+        transport=transport,
+        priority=PRIORITY,
+        max_workers=max_workers,
+    )
+
+    df_store = []
+    for ds in datasets:
+        df = listing_from_headers(urls[ds], [found.get(url) for url in urls[ds]])
+        df_store.append(build_avail_historical(df, ds))
+
+    return pd.concat(df_store)
 
-    txt = utils.get_url(txt_url)
+
+def parse_dataset(txt, dataset, rename_cols=True):
 
     if dataset == "standard":
         df = parse_standard(txt, rename_cols=rename_cols)
@@ -325,3 +434,50 @@ def get_dataset(txt_url, dataset, rename_cols=True):
         raise ValueError(f"Dataset must be one of {list(DATASETS)}.")
 
     return df
+
+
+def read_file(
+    txt_url, parse, gz_url=None, transport=None, refresh=None, priority=PRIORITY
+):
+    """Download a data file and parse it with `parse`.
+
+    When `gz_url` is given the gzipped file is streamed into the parser as it
+    downloads, so the file is never held in memory as a whole. NDBC's text
+    viewer at `txt_url` is used if that fails. The requests are made with
+    `priority`, see `utils.get_url`.
+
+    Returns:
+        The output of `parse`, or None if the file does not exist.
+    """
+
+    if gz_url is not None:
+        try:
+            f = utils.open_gzip_url(
+                gz_url, transport=transport, refresh=refresh, priority=priority
+            )
+        except (requests.RequestException, ValueError):
+            f = None
+
+        if f:
+            try:
+                # the file downloads as it is parsed, so both are timed here
+                with f, metrics.track_parse():
+                    return parse(f)
+            except (requests.RequestException, zlib.error):
+                pass
+
+    txt = utils.get_url(
+        txt_url, transport=transport, refresh=refresh, priority=priority
+    )
+    if not txt:
+        return None
+
+    with metrics.track_parse():
+        return parse(txt)
+
+
+def get_dataset(txt_url, dataset, rename_cols=True, gz_url=None, transport=None):
+    def parse(txt):
+        return parse_dataset(txt, dataset, rename_cols=rename_cols)
+
+    return read_file(txt_url, parse, gz_url=gz_url, transport=transport)
@@ -0,0 +1,137 @@
+"""Parser for the Apache directory listings NDBC serves its files from.
+
+The listings are regular enough that a single regular expression pulls out
+every row, which is many times faster than building an html tree with
+`pd.read_html` (the historical stdmet listing has tens of thousands of rows)
+and does not need lxml or bs4.
+"""
+
+import re
+from email.utils import parsedate_to_datetime
+from html import unescape
+import numpy as np
+import pandas as pd
+
+COLUMNS = ["file_name", "last_modified", "size", "description"]
+
+# columns of the available data the listings are turned into, e.g. by
+# historical.build_avail_historical
+AVAIL_COLUMNS = COLUMNS + [
+    "station_id",
+    "file_year",
+    "dataset_code",
+    "dataset",
+    "timeframe",
+    "url",
+    "txt_url",
+    "gz_url",
+]
+
+# a row links to the file, then gives its last modified date and size. Works
+# for both table and <pre> listings. The parent directory and the column
+# headers have no date so they never match.
+_SEP = r"(?:\s|<[^>]*>)*"
+_ROW = re.compile(
+    r'<a href="[^"]*">(?P<file_name>[^<]*)</a>'
+    + _SEP
+    + r"(?P<last_modified>\d{4}-\d{2}-\d{2} \d{2}:\d{2}(?::\d{2})?)"
+    + _SEP
+    + r"(?P<size>[\d.]+[KMGT]?|-)"
+    + r"\s*(?:</td>\s*<td[^>]*>(?P<description>[^<]*))?"
+)
+
+
+def _clean(value):
+    value = unescape(value).strip() if value else ""
+    return value or np.nan
+
+
+def parse_listing(txt):
+    """Parse an Apache directory listing.
+
+    Args:
+        txt (str): Html of the listing.
+
+    Returns:
+        Pandas dataframe with a row per file (and sub directory, whose name
+        ends in /) and the columns file_name, last_modified, size and
+        description, as shown in the listing.
+    """
+
+    rows = _ROW.findall(txt)
+    if not rows:
+        return pd.DataFrame(columns=COLUMNS)
+
+    file_name, last_modified, size, description = zip(*rows)
+
+    return pd.DataFrame(
+        {
+            "file_name": [unescape(name).strip() for name in file_name],
+            "last_modified": last_modified,
+            "size": size,
+            "description": [_clean(d) for d in description],
+        },
+        columns=COLUMNS,
+    )
+
+
+def empty_avail():
+    """Available data without any rows, e.g. when every listing is missing,
+    with the columns needed to filter it."""
+
+    return pd.DataFrame(columns=AVAIL_COLUMNS)
+
+
+def human_size(size):
+    """Format a size the way Apache's directory listings do (e.g. 1.2K)."""
+
+    for unit in ["", "K", "M", "G"]:
+        if size < 1024 or unit == "G":
+            break
+        size /= 1024
+
+    if not unit:
+        return str(int(size))
+    elif size < 10:
+        return f"{size:.1f}{unit}"
+    else:
+        return f"{size:.0f}{unit}"
+
+
+def _header_date(value):
+    try:
+        return f"{parsedate_to_datetime(value):%Y-%m-%d %H:%M}"
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def listing_from_headers(urls, headers):
+    """Build the rows a directory listing would have for files that were
+    checked with HEAD requests instead.
+
+    Args:
+        urls (list): Urls of the files.
+        headers (list): Response headers for each url, or a falsy value
+            (e.g. `utils.NotFound`) for files that do not exist.
+
+    Returns:
+        Pandas dataframe with the same columns as `parse_listing`, with a
+        row per existing file.
+    """
+
+    rows = []
+    for url, resp_headers in zip(urls, headers):
+        if not resp_headers:
+            continue
+
+        size = resp_headers.get("Content-Length")
+        rows.append(
+            (
+                url.rsplit("/", 1)[-1],
+                _header_date(resp_headers.get("Last-Modified")),
+                human_size(int(size)) if size else np.nan,
+                np.nan,
+            )
+        )
+
+    return pd.DataFrame(rows, columns=COLUMNS, dtype=object)
@@ -5,19 +5,21 @@ from .data.large_cities import large_cities
 from .utils import get_url, BASE_URL
 
 
+OWNERS_URL = f"{BASE_URL}/stations/station_owners.txt"
+LOCATIONS_URL = f"{BASE_URL}/stations/station_table.txt"
+
+
 # EXTRACT
-def extract_buoy_owners():
+def extract_buoy_owners(transport=None):
 
-    url = f"{BASE_URL}/stations/station_owners.txt"
-    txt = get_url(url)
+    txt = get_url(OWNERS_URL, transport=transport)
 
     return txt
 
 
-def extract_buoy_locations():
+def extract_buoy_locations(transport=None):
 
-    url = f"{BASE_URL}/stations/station_table.txt"
-    txt = get_url(url)
+    txt = get_url(LOCATIONS_URL, transport=transport)
 
     return txt
 
@@ -85,20 +87,28 @@ def add_owners(df_buoys, df_owners):
     return df
 
 
-# MAIN INTERFACE
-
-
-def buoy_info(closest_cities=True, owners=True):
+def parse_buoy_info(txt_locations, txt_owners=None, closest_cities=True):
+    """Build the station table from the raw location and owner files. The
+    owners are only joined on when `txt_owners` is passed."""
 
-    txt = extract_buoy_locations()
-    df = parse_buoy_locations(txt)
+    df = parse_buoy_locations(txt_locations)
 
     if closest_cities:
         df = add_closest_cities(df)
 
-    if owners:
-        txt = extract_buoy_owners()
-        df_owners = parse_buoy_owners(txt)
+    if txt_owners is not None:
+        df_owners = parse_buoy_owners(txt_owners)
         df = add_owners(df, df_owners)
 
     return df
+
+
+# MAIN INTERFACE
+
+
+def buoy_info(closest_cities=True, owners=True, transport=None):
+
+    txt_locations = extract_buoy_locations(transport=transport)
+    txt_owners = extract_buoy_owners(transport=transport) if owners else None
+
+    return parse_buoy_info(txt_locations, txt_owners, closest_cities=closest_cities)
@@ -0,0 +1,214 @@
+"""Request level metrics.
+
+Every request made through `utils` is described by a `RequestEvent` once it
+finishes. Events are added up in `stats` and passed to the callbacks
+registered with `add_callback`, e.g. to export them to a monitoring system:
+
+    from seebuoy.ndbc import metrics
+
+    metrics.add_callback(lambda event: print(event))
+    ...
+    metrics.stats.summary()
+"""
+
+import threading
+import time
+import warnings
+from collections import Counter
+from contextlib import contextmanager
+
+_callbacks = []
+_callbacks_lock = threading.Lock()
+
+
+class RequestEvent:
+    """What happened during a single request.
+
+    Attributes:
+        url (str): Url of the request.
+        method (str): HTTP method, GET or HEAD.
+        status_code (int): Status of the response, None if it failed before
+            a response arrived.
+        n_bytes (int): Bytes of body received. 0 when served from the cache.
+        ttfb (float): Seconds from sending the request to receiving the
+            response headers.
+        elapsed (float): Seconds from sending the request to having read
+            the whole body.
+        cache (str): "hit" when served from the disk cache without asking
+            NDBC, "revalidated" when NDBC confirmed the cached copy is
+            current, "miss" when the file was downloaded and "bypass" for
+            requests that do not go through the cache.
+        retries (int): Number of times the request was retried.
+        error (str): The exception raised, if the request failed.
+    """
+
+    def __init__(self, url, method="GET", cache="miss"):
+        self.url = url
+        self.method = method
+        self.status_code = None
+        self.n_bytes = 0
+        self.ttfb = None
+        self.elapsed = 0.0
+        self.cache = cache
+        self.retries = 0
+        self.error = None
+
+        self.started = time.monotonic()
+        self._sent = None
+        self._finished = False
+
+    def sent(self):
+        """Mark the moment the request is sent, after any queueing."""
+        self._sent = time.monotonic()
+
+    def received(self, resp):
+        """Record the status of a response whose headers just arrived."""
+
+        self.status_code = resp.status_code
+
+        # requests measures up to the headers even when the body was read
+        elapsed = getattr(resp, "elapsed", None)
+        if elapsed is not None:
+            self.ttfb = elapsed.total_seconds()
+        else:
+            self.ttfb = time.monotonic() - (self._sent or self.started)
+
+    def finish(self, error=None):
+        """Record the end of the request and report it. Only the first call
+        counts."""
+
+        if self._finished:
+            return
+        self._finished = True
+
+        self.elapsed = time.monotonic() - (self._sent or self.started)
+        if error is not None:
+            self.error = repr(error)
+
+        emit(self)
+
+    def __repr__(self):
+        return (
+            f"RequestEvent({self.method} {self.url}, status={self.status_code}, "
+            f"bytes={self.n_bytes}, ttfb={self.ttfb}, elapsed={self.elapsed:.3f}, "
+            f"cache={self.cache}, retries={self.retries})"
+        )
+
+
+class Stats:
+    """Running totals of the requests made and of the time spent parsing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.n_bytes = 0
+            self.errors = 0
+            self.retries = 0
+            self.ttfb = 0.0
+            self.elapsed = 0.0
+            self.max_elapsed = 0.0
+            self.cache = Counter()
+            self.status_codes = Counter()
+            self.files_parsed = 0
+            self.parse_time = 0.0
+
+    def record(self, event):
+        with self._lock:
+            self.requests += 1
+            self.n_bytes += event.n_bytes
+            self.retries += event.retries
+            self.ttfb += event.ttfb or 0.0
+            self.elapsed += event.elapsed
+            self.max_elapsed = max(self.max_elapsed, event.elapsed)
+            self.cache[event.cache] += 1
+            if event.error is not None:
+                self.errors += 1
+            if event.status_code is not None:
+                self.status_codes[event.status_code] += 1
+
+    def record_parse(self, seconds):
+        with self._lock:
+            self.files_parsed += 1
+            self.parse_time += seconds
+
+    def summary(self):
+        """Totals and averages as a dict, ready to be exported."""
+
+        with self._lock:
+            n_requests = self.requests or 1
+            n_parsed = self.files_parsed or 1
+            return {
+                "requests": self.requests,
+                "bytes": self.n_bytes,
+                "errors": self.errors,
+                "retries": self.retries,
+                "cache_hits": self.cache["hit"],
+                "cache_revalidated": self.cache["revalidated"],
+                "cache_misses": self.cache["miss"],
+                "status_codes": dict(self.status_codes),
+                "mean_ttfb": self.ttfb / n_requests,
+                "mean_elapsed": self.elapsed / n_requests,
+                "max_elapsed": self.max_elapsed,
+                "files_parsed": self.files_parsed,
+                "mean_parse_time": self.parse_time / n_parsed,
+            }
+
+
+# totals for every request made by seebuoy
+stats = Stats()
+
+
+def add_callback(func):
+    """Call `func` with the RequestEvent of every finished request. Callbacks
+    run in the thread that made the request, so they should be quick. An
+    exception raised by a callback is turned into a warning instead of
+    failing the request."""
+
+    with _callbacks_lock:
+        _callbacks.append(func)
+
+
+def remove_callback(func):
+    with _callbacks_lock:
+        _callbacks.remove(func)
+
+
+def emit(event):
+    stats.record(event)
+
+    with _callbacks_lock:
+        callbacks = list(_callbacks)
+
+    for func in callbacks:
+        try:
+            func(event)
+        except Exception as e:
+            warnings.warn(f"Metrics callback {func!r} failed: {e!r}", RuntimeWarning)
+
+
+@contextmanager
+def track(url, method="GET", cache="miss"):
+    """Context in which a request is made. Yields the RequestEvent to fill in
+    and reports it when the context exits."""
+
+    event = RequestEvent(url, method=method, cache=cache)
+    try:
+        yield event
+    except BaseException as e:
+        event.finish(error=e)
+        raise
+    else:
+        event.finish()
+
+
+@contextmanager
+def track_parse():
+    """Context in which a file is parsed, timed into `stats`."""
+
+    start = time.monotonic()
+    yield
+    stats.record_parse(time.monotonic() - start)
@@ -0,0 +1,196 @@
+"""Mirror parts of NDBC's data/ directory to local disk.
+
+Only files that are new or whose last modified date or size changed since the
+previous sync are downloaded, so refreshing a mirror is cheap. The mirror can
+be read back with `transport.LocalTransport`.
+
+Example:
+    python -m seebuoy.ndbc.mirror /mnt/ndbc/data --path realtime2 \\
+        --path historical/stdmet --current-year standard
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+import pandas as pd
+from . import current_year
+from . import listing
+from . import metrics
+from . import utils
+
+MANIFEST = ".seebuoy-manifest.json"
+
+
+def current_year_paths(datasets=("standard",)):
+    """Paths of the monthly current year folders, e.g. stdmet/Jan."""
+
+    return [
+        f"{current_year.DATASETS[dataset]}/{month}"
+        for dataset in datasets
+        for month in current_year.MONTHS
+    ]
+
+
+def parse_listing(txt):
+    """Parse a directory listing into file_name, last_modified and size."""
+
+    df = listing.parse_listing(txt)
+    df = df[["file_name", "last_modified", "size"]]
+
+    # skip sub directories
+    df = df[~df["file_name"].str.endswith("/")]
+    df = df.astype(str)
+
+    return df
+
+
+def load_manifest(dest):
+    try:
+        with open(os.path.join(dest, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(dest, manifest):
+    path = os.path.join(dest, MANIFEST)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def download_file(url, path, last_modified=None, transport=None):
+    """Stream a file to `path`, setting its mtime to `last_modified`."""
+
+    transport = transport or utils.get_transport()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def download():
+        event.n_bytes = 0
+        with utils.limited(event=event, transport=transport):
+            event.sent()
+            resp = transport.get(url, stream=True)
+            event.received(resp)
+            if resp.status_code != 200:
+                resp.close()
+                retry_after = resp.headers.get("Retry-After")
+                raise utils.HTTPStatusError(url, resp.status_code, retry_after)
+
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in resp.iter_content(utils.CHUNK_SIZE):
+                        event.n_bytes += len(chunk)
+                        f.write(chunk)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            finally:
+                resp.close()
+
+    with metrics.track(url, cache="bypass") as event:
+        utils.with_retries(url, download, event, transport)
+
+    if last_modified:
+        # listing dates are in UTC: 2023-01-05 13:05
+        mtime = datetime.strptime(last_modified, "%Y-%m-%d %H:%M")
+        mtime = mtime.replace(tzinfo=timezone.utc).timestamp()
+        os.utime(path, (mtime, mtime))
+
+
+def sync(dest, paths=("realtime2",), max_workers=None, transport=None):
+    """Mirror NDBC directories to `dest`, downloading only what changed.
+
+    The last modified date and size of every mirrored file, as shown in
+    NDBC's listings, is kept in a manifest in `dest`. A file is downloaded
+    when it is missing from the manifest or either value changed.
+
+    Args:
+        dest (str): Local directory mirroring NDBC's data/ directory.
+        paths (list): Directories under data/ to mirror, e.g. "realtime2",
+            "historical/stdmet" or "stdmet/Jan" (see `current_year_paths`).
+        max_workers (int): Number of files downloaded at once. Defaults to
+            `utils.MAX_WORKERS`.
+        transport (Transport): Transport used to reach NDBC.
+
+    Returns:
+        Pandas dataframe of the files that were downloaded.
+    """
+
+    dest = os.path.expanduser(dest)
+    os.makedirs(dest, exist_ok=True)
+    manifest = load_manifest(dest)
+    lock = threading.Lock()
+
+    df_store = []
+    for path in paths:
+        txt = utils.get_url(f"{utils.BASE_URL}/{path}", transport=transport)
+        if not txt:
+            continue
+
+        df = parse_listing(txt)
+        df["path"] = path + "/" + df["file_name"]
+        df_store.append(df)
+
+    columns = ["file_name", "last_modified", "size", "path"]
+    rows = [
+        row
+        for df in df_store
+        for row in df.to_dict(orient="records")
+        if manifest.get(row["path"]) != [row["last_modified"], row["size"]]
+    ]
+
+    def download(row):
+        download_file(
+            f"{utils.BASE_URL}/{row['path']}",
+            os.path.join(dest, *row["path"].split("/")),
+            last_modified=row["last_modified"],
+            transport=transport,
+        )
+        with lock:
+            manifest[row["path"]] = [row["last_modified"], row["size"]]
+
+    try:
+        utils.map_concurrent(download, rows, max_workers=max_workers)
+    finally:
+        # keep track of what did download even if a file failed
+        save_manifest(dest, manifest)
+
+    return pd.DataFrame(rows, columns=columns)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Mirror NDBC data to local disk, downloading only changes."
+    )
+    parser.add_argument("dest", help="local directory mirroring NDBC's data/")
+    parser.add_argument(
+        "--path",
+        action="append",
+        default=[],
+        help="directory under data/ to mirror, e.g. realtime2 or historical/stdmet",
+    )
+    parser.add_argument(
+        "--current-year",
+        action="append",
+        default=[],
+        metavar="DATASET",
+        help="mirror the monthly current year folders of a dataset, e.g. standard",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    paths = args.path + current_year_paths(args.current_year)
+    if not paths:
+        parser.error("pass at least one --path or --current-year")
+
+    df = sync(args.dest, paths, max_workers=args.workers)
+    print(f"Downloaded {len(df)} files.")
+
+
+if __name__ == "__main__":
+    main()
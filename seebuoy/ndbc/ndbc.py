@@ -1,8 +1,20 @@
+from datetime import datetime
+from functools import partial
 import pandas as pd
 from . import metadata
 from . import real_time
 from . import current_year
 from . import historical
+from . import utils
+from .catalog import Catalog
+
+# the listings behind each of NDBC's timeframes
+TIMEFRAMES = {
+    "historical": ["real_time", "current_year", "historical"],
+    "real_time": ["real_time"],
+    "current_year_only": ["current_year"],
+    "historical_only": ["historical"],
+}
 
 
 class NDBC:
@@ -33,15 +45,28 @@ class NDBC:
 
     """
 
-    def __init__(self, timeframe="real_time"):
+    def __init__(self, timeframe="real_time", transport=None, catalog=None):
         """Initialize NDBC for a specific time frame.
 
         Args:
             timeframe (str): The timeframe for which to pull data. Can be
                 'real_time', 'historical', 'historical_only', 'current_year_only'.
+            transport (Transport): Where files are read from. Defaults to NDBC's
+                website over HTTP. See `seebuoy.ndbc.transport` for reading a
+                local mirror (LocalTransport) or recorded fixtures
+                (FixtureTransport).
+            catalog (Catalog or str): Local catalog in which the available
+                data is kept, or the directory to keep it in. Lookups are then
+                answered from the catalog and NDBC's listings are only
+                downloaded again, in the background, once its ttl expires.
 
         """
         self.timeframe = timeframe
+        self.transport = transport
+
+        if isinstance(catalog, str):
+            catalog = Catalog(catalog)
+        self.catalog = catalog
 
     def stations(self, station_id=None, closest_cities=True, owners=True):
         """Pull data for all NDBC stations.
@@ -55,7 +80,9 @@ class NDBC:
             Pandas dataframe of station information.
         """
 
-        df = metadata.buoy_info(closest_cities=closest_cities, owners=owners)
+        df = metadata.buoy_info(
+            closest_cities=closest_cities, owners=owners, transport=self.transport
+        )
 
         self.df_buoys = df
 
@@ -65,7 +92,14 @@ class NDBC:
 
         return df
 
-    def available_data(self, dataset="standard", station_id=None):
+    def available_data(
+        self,
+        dataset="standard",
+        station_id=None,
+        refresh=None,
+        max_workers=None,
+        probe=False,
+    ):
         """Lists the available data for the given parameters.
 
         Args:
@@ -73,31 +107,62 @@ class NDBC:
                 pass "all" to pull all available data.
             station_id (str): The station_id to return. If None, returns data
                 for all stations.
+            refresh (str): How files already in the disk cache are
+                refreshed. None to reuse them until the cache's ttl expires.
+                "if-changed" to check with a cheap HEAD request whether they
+                changed and only download them again if they did. NDBC's
+                listings carry no Last-Modified, so they keep using the ttl.
+            max_workers (int): Number of listings to download at once.
+                Defaults to `utils.MAX_WORKERS`.
+            probe (bool): Instead of downloading NDBC's listings, build the
+                urls the files of `station_id` would have and check them
+                with HEAD requests, newest first until several years (or
+                months) in a row have no file. Historical files are only
+                checked for the datasets in `historical.FILE_LETTERS`, the
+                listing is downloaded for the others. Not needed with a
+                catalog, which answers single station lookups from its index.
 
         Returns:
             Pandas dataframe of availble data.
         """
-        if self.timeframe == "historical":
-            df_real = real_time.avail_real_time(dataset)
-            df_current = current_year.avail_current_year(dataset)
-            df_historic = historical.avail_historical(dataset)
-
-            df = pd.concat([df_real, df_current, df_historic])
+        utils.check_refresh(refresh)
 
-        elif self.timeframe == "real_time":
-            df = real_time.avail_real_time(dataset)
-
-        elif self.timeframe == "current_year_only":
-            df = current_year.avail_current_year(dataset)
-
-        elif self.timeframe == "historical_only":
-            df = historical.avail_historical(dataset)
-
-        else:
+        if self.timeframe not in TIMEFRAMES:
             raise ValueError(
                 "self.timeframe must be 'all', 'real_time', 'current_year', or 'historical'"
             )
 
+        if probe and station_id is None:
+            raise ValueError("probe needs a station_id.")
+
+        if self.catalog is not None:
+            df = self._avail_from_catalog(
+                dataset, station_id, refresh=refresh, max_workers=max_workers
+            )
+            self.df_avail = df
+            return df
+
+        if probe:
+            df = pd.concat(
+                [
+                    self._probe_avail(
+                        timeframe, dataset, station_id, max_workers=max_workers
+                    )
+                    for timeframe in TIMEFRAMES[self.timeframe]
+                ]
+            )
+            self.df_avail = df
+            return df
+
+        df = pd.concat(
+            [
+                self._fetch_avail(
+                    timeframe, dataset, refresh=refresh, max_workers=max_workers
+                )
+                for timeframe in TIMEFRAMES[self.timeframe]
+            ]
+        )
+
         self.df_avail = df
 
         if station_id is not None:
@@ -106,12 +171,154 @@ class NDBC:
 
         return df
 
+    def _avail_from_catalog(
+        self, dataset, station_id=None, refresh=None, max_workers=None
+    ):
+        """Available data from the catalog, downloading the listings it does
+        not have yet."""
+
+        df_store = []
+        for timeframe in TIMEFRAMES[self.timeframe]:
+            fetch, fetch_changed = self._catalog_fetchers(
+                timeframe, dataset, refresh=refresh, max_workers=max_workers
+            )
+            df = self.catalog.get(
+                timeframe, dataset, fetch, fetch_changed, station_id=station_id
+            )
+            df_store.append(df)
+
+        return pd.concat(df_store)
+
+    def refresh_catalog(self, dataset="standard", refresh=None, max_workers=None):
+        """Bring the catalog up to date, e.g. from an hourly job.
+
+        Only the listings that can change (realtime2 and the current month's
+        folders) are downloaded once the catalog's ttl expires, and changed
+        rows merged in. Every listing, including the historical ones, is
+        downloaded again once its `full_ttl` expires.
+
+        Args:
+            dataset (str): The dataset to refresh, or "all".
+            refresh (str): How listings in the disk cache are refreshed, see
+                `available_data`.
+            max_workers (int): Number of listings to download at once.
+
+        Returns:
+            Number of catalog rows added, changed or removed.
+        """
+        utils.check_refresh(refresh)
+
+        if self.catalog is None:
+            raise ValueError("NDBC was created without a catalog.")
+
+        n_changed = 0
+        for timeframe in TIMEFRAMES[self.timeframe]:
+            fetch, fetch_changed = self._catalog_fetchers(
+                timeframe, dataset, refresh=refresh, max_workers=max_workers
+            )
+            n_changed += self.catalog.refresh(timeframe, dataset, fetch, fetch_changed)
+
+        return n_changed
+
+    def _catalog_fetchers(self, timeframe, dataset, refresh=None, max_workers=None):
+        """Functions the catalog downloads every listing of a timeframe with,
+        and only the listings that may have changed (None for historical
+        listings, which only change once a year)."""
+
+        fetch = partial(
+            self._fetch_avail,
+            timeframe,
+            dataset,
+            refresh=refresh,
+            max_workers=max_workers,
+        )
+
+        if timeframe == "real_time":
+            # a single listing, always downloaded whole
+            return fetch, lambda refreshed_at: (fetch(), None)
+
+        if timeframe == "current_year":
+
+            def fetch_changed(refreshed_at):
+                months = current_year.changed_months(
+                    datetime.utcfromtimestamp(refreshed_at)
+                )
+                if months is None:
+                    return fetch(), None
+
+                datasets = current_year.DATASETS if dataset == "all" else [dataset]
+                prefixes = [
+                    f"{current_year.DATASETS[ds]}/{month}/"
+                    for ds in datasets
+                    for month in months
+                ]
+                return fetch(months=months), prefixes
+
+            return fetch, fetch_changed
+
+        return fetch, None
+
+    def _fetch_avail(
+        self, timeframe, dataset, refresh=None, max_workers=None, months=None
+    ):
+        """Download and parse the listings of a single timeframe, for the
+        current year only those of `months` if given."""
+
+        transport = self.transport
+
+        if timeframe == "real_time":
+            return real_time.avail_real_time(
+                dataset, transport=transport, refresh=refresh
+            )
+
+        if timeframe == "current_year":
+            return current_year.avail_current_year(
+                dataset,
+                transport=transport,
+                refresh=refresh,
+                max_workers=max_workers,
+                months=months,
+            )
+
+        return historical.avail_historical(
+            dataset, transport=transport, max_workers=max_workers
+        )
+
+    def _probe_avail(self, timeframe, dataset, station_id, max_workers=None):
+        """Files of a single station and timeframe, found with HEAD requests."""
+
+        transport = self.transport
+
+        if timeframe == "real_time":
+            return real_time.avail_station_real_time(
+                station_id, dataset, transport=transport, max_workers=max_workers
+            )
+
+        if timeframe == "current_year":
+            return current_year.avail_station_current_year(
+                station_id, dataset, transport=transport, max_workers=max_workers
+            )
+
+        if dataset != "all" and dataset not in historical.FILE_LETTERS:
+            # file names not known, fall back to the listing
+            df = self._fetch_avail(timeframe, dataset, max_workers=max_workers)
+            return df[df["station_id"] == station_id].copy()
+
+        return historical.avail_station_historical(
+            station_id, dataset, transport=transport, max_workers=max_workers
+        )
+
     def get_data(
         self,
         station_id,
         dataset="standard",
         rename_cols=True,
         drop_duplicates=True,
+        max_workers=None,
+        compressed=True,
+        since=None,
+        last_n_hours=None,
+        refresh=None,
     ):
         """Pull data for a single station.
 
@@ -122,43 +329,174 @@ class NDBC:
             drop_duplicates (bool): If pulling historical data, there can be
                 duplicate records in the current year and real time datasets. This
                 argument only keeps one
+            max_workers (int): Number of files to download at once. Defaults to
+                `utils.MAX_WORKERS`. Pass 1 to download them one at a time.
+            compressed (bool): Download the gzipped historical and current year
+                files and decompress them locally. NDBC's text viewer is only
+                used as a fallback.
+            since (str or datetime): Only return data at or after this date
+                (UTC). Realtime files are then only partially downloaded and
+                files that end before this date are skipped.
+            last_n_hours (float): Only return data from the last n hours.
+                Shorthand for `since`.
+            refresh (str): How realtime and current year files already in
+                the disk cache are refreshed. None to reuse them until the
+                cache's ttl expires. "if-changed" to check with a cheap HEAD
+                request whether they changed and only download them again if
+                they did.
 
         Returns:
-            Pandas dataframe of data for the given station.
+            Pandas dataframe of data for the given station, empty if there is
+            none.
 
         """
+        utils.check_refresh(refresh)
 
-        m1 = self.df_avail["station_id"] == station_id
-        m2 = self.df_avail["dataset"] == dataset
-        df_avail = self.df_avail[m1 & m2]
+        if self.catalog is not None:
+            df_avail = self._avail_from_catalog(dataset, station_id)
+        else:
+            m1 = self.df_avail["station_id"] == station_id
+            m2 = self.df_avail["dataset"] == dataset
+            df_avail = self.df_avail[m1 & m2]
+
+        rows = df_avail.to_dict(orient="records")
+
+        if last_n_hours is not None:
+            since = pd.Timestamp.utcnow() - pd.Timedelta(hours=last_n_hours)
+
+        if since is not None:
+            since = _to_utc(since)
+            rows = [row for row in rows if _may_have_data_since(row, since)]
+
+        def fetch(row):
+            return self._get_file(
+                row,
+                rename_cols=rename_cols,
+                compressed=compressed,
+                since=since,
+                refresh=refresh,
+            )
 
-        df_store = []
+        # results come back in the same order as rows, so the first record
+        # kept by drop_duplicates is the same as when pulling serially
+        df_store = utils.map_concurrent(fetch, rows, max_workers=max_workers)
 
-        for row in df_avail.to_dict(orient="records"):
+        # files listed but missing on NDBC (404) come back as None
+        df_store = [df for df in df_store if df is not None]
 
-            timeframe = row["timeframe"]
-            txt_url = row["txt_url"]
-            dataset = row["dataset"]
+        # nothing listed, nothing recent enough or every file missing
+        if not df_store:
+            return pd.DataFrame()
 
-            if timeframe == "real_time":
-                df = real_time.get_dataset(txt_url, dataset, rename_cols=rename_cols)
+        df = pd.concat(df_store)
 
-            elif timeframe == "current_year":
-                df = current_year.get_dataset(txt_url, dataset, rename_cols=rename_cols)
+        if since is not None:
+            df = df[df.index >= since]
 
-            elif timeframe == "historical":
-                df = historical.get_dataset(txt_url, dataset, rename_cols=rename_cols)
+        if drop_duplicates:
+            df = df[~df.index.duplicated(keep="first")]
 
-            else:
-                raise ValueError(
-                    "timeframe is not real_time, current_year, or historical."
-                )
+        return df.sort_index()
 
-            df_store.append(df)
+    def _get_file(
+        self, row, rename_cols=True, compressed=True, since=None, refresh=None
+    ):
+        """Download and parse a single row of the available data.
 
-        df = pd.concat(df_store)
+        Concurrent requests for the same file, from any thread or NDBC
+        instance using the same transport, share one download and one parsed
+        dataframe. Returns None if the file is missing on NDBC.
+        """
 
-        if drop_duplicates:
-            df = df[~df.index.duplicated(keep="first")]
+        transport = self.transport
+        key = (
+            "get_file",
+            row["txt_url"],
+            rename_cols,
+            compressed,
+            since,
+            refresh,
+            transport,
+        )
+        return utils.flights.do(
+            key,
+            self._fetch_file,
+            row,
+            rename_cols=rename_cols,
+            compressed=compressed,
+            since=since,
+            refresh=refresh,
+        )
+
+    def _fetch_file(
+        self, row, rename_cols=True, compressed=True, since=None, refresh=None
+    ):
 
-        return df.sort_index()
+        timeframe = row["timeframe"]
+        txt_url = row["txt_url"]
+        dataset = row["dataset"]
+        transport = self.transport
+
+        gz_url = row.get("gz_url")
+        if not compressed or pd.isna(gz_url):
+            gz_url = None
+
+        if timeframe == "real_time":
+            df = real_time.get_dataset(
+                txt_url,
+                dataset,
+                rename_cols=rename_cols,
+                since=since,
+                transport=transport,
+                refresh=refresh,
+            )
+
+        elif timeframe == "current_year":
+            df = current_year.get_dataset(
+                txt_url,
+                dataset,
+                rename_cols=rename_cols,
+                gz_url=gz_url,
+                transport=transport,
+                refresh=refresh,
+            )
+
+        elif timeframe == "historical":
+            df = historical.get_dataset(
+                txt_url,
+                dataset,
+                rename_cols=rename_cols,
+                gz_url=gz_url,
+                transport=transport,
+            )
+
+        else:
+            raise ValueError("timeframe is not real_time, current_year, or historical.")
+
+        return df
+
+
+def _to_utc(date):
+    """Convert a date to a naive UTC timestamp to match the NDBC data."""
+
+    date = pd.Timestamp(date)
+    if date.tzinfo is not None:
+        date = date.tz_convert("UTC").tz_localize(None)
+
+    return date
+
+
+def _may_have_data_since(row, since):
+    """Whether the file in a row of the available data can hold data at or
+    after `since`, judging from the year (and month) in its name."""
+
+    if row["timeframe"] == "historical":
+        return int(row["file_year"]) >= since.year
+
+    if row["timeframe"] == "current_year":
+        # url looks like stdmet/Jan/4101312023.txt.gz
+        month = current_year.MONTHS.get(row["url"].split("/")[1])
+        if month is not None and since.year == pd.Timestamp.utcnow().year:
+            return month >= since.month
+
+    return True
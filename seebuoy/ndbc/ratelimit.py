@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # no file locks on windows, limits are then only shared between threads
+    fcntl = None
+
+
+@contextmanager
+def _file_lock(path):
+    with open(path, "a+") as f:
+        if fcntl is None:
+            yield f
+            return
+
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield f
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class RateLimiter:
+    """Token bucket limiting the request rate and concurrent connections.
+
+    The limits are shared by every thread in the process. With `lock_dir` set
+    they are also shared by every process on the host that points to the same
+    directory: the bucket lives in a file guarded by a file lock and each
+    connection holds a lock on one of `max_connections` slot files.
+
+    Args:
+        rate (float): Requests per second. None for no rate limit.
+        burst (int): Requests that can be made at once after being idle.
+            Defaults to `rate` (at least 1).
+        max_connections (int): Maximum number of requests in flight. None for
+            no limit.
+        lock_dir (str): Directory holding the shared bucket and slot files.
+            None to only share the limits between threads.
+    """
+
+    def __init__(self, rate=None, burst=None, max_connections=None, lock_dir=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate or 1))
+        self.max_connections = max_connections
+        self.lock_dir = os.path.expanduser(lock_dir) if lock_dir else None
+
+        if fcntl is None:
+            self.lock_dir = None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = time.time()
+        self._semaphore = (
+            threading.BoundedSemaphore(max_connections) if max_connections else None
+        )
+
+    def _refill(self, tokens, updated, now):
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def _take_token(self):
+        """Take a token if one is available. Returns the seconds to wait
+        before trying again, 0 if a token was taken."""
+
+        with self._lock:
+            now = time.time()
+
+            if self.lock_dir is None:
+                tokens = self._refill(self._tokens, self._updated, now)
+                wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+                self._tokens = tokens - 1 if tokens >= 1 else tokens
+                self._updated = now
+                return wait
+
+            path = os.path.join(self.lock_dir, "bucket.json")
+            with _file_lock(path) as f:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read())
+                    tokens = self._refill(state["tokens"], state["updated"], now)
+                except (ValueError, KeyError):
+                    tokens = float(self.burst)
+
+                wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+                if tokens >= 1:
+                    tokens -= 1
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps({"tokens": tokens, "updated": now}))
+                f.flush()
+
+            return wait
+
+    def wait_for_token(self):
+        """Block until the rate limit allows another request."""
+
+        if not self.rate:
+            return
+
+        while True:
+            wait = self._take_token()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    @contextmanager
+    def connection(self, blocking=True):
+        """Hold one of the `max_connections` slots. Yields whether a slot is
+        held, which is only False when not `blocking` and all are taken."""
+
+        if self._semaphore is None:
+            yield True
+            return
+
+        if not self._semaphore.acquire(blocking=blocking):
+            yield False
+            return
+
+        try:
+            if self.lock_dir is None:
+                yield True
+                return
+
+            f = self._acquire_slot(blocking)
+            if f is None:
+                yield False
+                return
+
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+                f.close()
+        finally:
+            self._semaphore.release()
+
+    def _acquire_slot(self, blocking=True):
+        while True:
+            for i in range(self.max_connections):
+                path = os.path.join(self.lock_dir, f"slot-{i}.lock")
+                f = open(path, "a")
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return f
+                except OSError:
+                    f.close()
+
+            if not blocking:
+                return None
+            time.sleep(0.05)
+
+    @contextmanager
+    def limit(self):
+        """Wait for a connection slot and a token before making a request."""
+
+        with self.connection():
+            self.wait_for_token()
+            yield
+
+    @contextmanager
+    def try_limit(self):
+        """Like `limit`, without waiting. Yields whether a slot and a token
+        were free, e.g. to only send an optional request when they are."""
+
+        with self.connection(blocking=False) as connected:
+            yield connected and (not self.rate or self._take_token() <= 0)
@@ -1,7 +1,18 @@
 from io import StringIO
 import pandas as pd
+from . import metrics
+from .listing import listing_from_headers, parse_listing
 from . import utils
 
+# realtime polling goes ahead of backfills when waiting for a connection
+PRIORITY = utils.PRIORITY_HIGH
+
+# bytes requested first when only the most recent rows are needed
+HEAD_SIZE = 64 * 1024
+
+# times the range is doubled before the whole file is downloaded instead
+MAX_DOUBLINGS = 5
+
 DATASETS = {
     "adcp": "adcp",
     "adcp2": "adcp2",
@@ -67,7 +78,11 @@ SUPPLEMENTAL_MAP = {
 # EXTRACT
 
 
-def extract_avail_real_time():
+def avail_url():
+    return f"{utils.BASE_URL}/realtime2"
+
+
+def extract_avail_real_time(transport=None, refresh=None):
     """All recent data (realtime) is put into the same folder. For example:
     realtime2/
         41013.data_spec
@@ -80,36 +95,41 @@ def extract_avail_real_time():
         41013.txt
     """
 
-    url = f"{utils.BASE_URL}/realtime2"
-    txt = utils.get_url(url)
+    txt = utils.get_url(
+        avail_url(), transport=transport, refresh=refresh, priority=PRIORITY
+    )
 
     return txt
 
 
-def extract_station(station_id, dataset):
+def extract_station(station_id, dataset, transport=None):
 
-    dataset_code = utils.DATASETS[dataset]
-    url = f"https://www.ndbc.noaa.gov/data/realtime2/{station_id}.{dataset_code}"
+    dataset_code = DATASETS[dataset]
+    url = f"{utils.BASE_URL}/realtime2/{station_id}.{dataset_code}"
 
-    txt = utils.get_url(url)
+    txt = utils.get_url(url, transport=transport, priority=PRIORITY)
 
     return txt
 
 
+def station_urls(station_id, dataset="standard"):
+    """Urls the realtime files of a station would have, "all" for every
+    dataset."""
+
+    datasets = DATASETS if dataset == "all" else [dataset]
+
+    return [f"{avail_url()}/{station_id}.{DATASETS[ds]}" for ds in datasets]
+
+
 # TRANSFORM
 def parse_avail_real_time(txt):
 
-    df = pd.read_html(txt)[0]
-    df = df.dropna(subset=["Last modified"])
+    return build_avail_real_time(parse_listing(txt))
 
-    col_rename = {
-        "Name": "file_name",
-        "Last modified": "last_modified",
-        "Size": "size",
-        "Description": "description",
-    }
 
-    df = df[list(col_rename)].rename(columns=col_rename)
+def build_avail_real_time(df):
+    """Add the station, dataset and urls to the rows of a realtime2
+    listing."""
 
     df["station_id"] = df["file_name"].str.split(".").str[0]
     df["dataset_code"] = df["file_name"].str.split(".").str[1]
@@ -380,10 +400,12 @@ def parse_spectral_r2(txt):
 # MAIN INTERFACE
 
 
-def avail_real_time(dataset="standard"):
+def avail_real_time(dataset="standard", transport=None, refresh=None):
+
+    txt = extract_avail_real_time(transport=transport, refresh=refresh)
 
-    txt = extract_avail_real_time()
-    df = parse_avail_real_time(txt)
+    # a missing listing, e.g. on a partial mirror, lists no files
+    df = parse_avail_real_time(txt or "")
 
     if dataset != "all":
         m = df["dataset"] == dataset
@@ -392,9 +414,21 @@ def avail_real_time(dataset="standard"):
     return df
 
 
-def get_dataset(txt_url, dataset, rename_cols=True):
+def avail_station_real_time(
+    station_id, dataset="standard", transport=None, max_workers=None
+):
+    """Realtime files of a single station, found with a HEAD request per
+    candidate file instead of downloading the whole realtime2 listing."""
+
+    urls = station_urls(station_id, dataset)
+    headers = utils.head_urls(
+        urls, transport=transport, priority=PRIORITY, max_workers=max_workers
+    )
+
+    return build_avail_real_time(listing_from_headers(urls, headers))
 
-    txt = utils.get_url(txt_url)
+
+def parse_dataset(txt, dataset, rename_cols=True):
 
     if dataset == "standard":
         df = parse_standard(txt, rename_cols=rename_cols)
@@ -426,3 +460,86 @@ def get_dataset(txt_url, dataset, rename_cols=True):
         raise ValueError(f"Dataset must be one of {list(DATASETS)}.")
 
     return df
+
+
+def _last_timestamp(txt):
+    """Date of the last row of a realtime file (the oldest, rows are newest
+    first). Returns None if there are no data rows."""
+
+    for line in reversed(txt.splitlines()):
+        if line and not line.startswith("#"):
+            fields = line.split()[:5]
+            try:
+                return pd.to_datetime(" ".join(fields), format="%Y %m %d %H %M")
+            except ValueError:
+                return None
+
+    return None
+
+
+def get_recent_text(txt_url, since, head_size=None, transport=None):
+    """Download only the head of a realtime file, enough to cover `since`.
+
+    Realtime files list the newest rows first, so the data since a given
+    date is at the start of the file. The head is fetched with a Range
+    request, doubling the range until it reaches back to `since`. After
+    MAX_DOUBLINGS the whole file is downloaded instead.
+    """
+
+    n_bytes = head_size or HEAD_SIZE
+    for _ in range(MAX_DOUBLINGS + 1):
+        txt, complete = utils.get_url_head(
+            txt_url, n_bytes, transport=transport, priority=PRIORITY
+        )
+
+        if not txt or complete:
+            return txt
+
+        # drop the partial line at the end of the range
+        txt = txt[: txt.rfind("\n") + 1]
+
+        oldest = _last_timestamp(txt)
+        if oldest is not None and oldest <= since:
+            return txt
+
+        n_bytes *= 2
+
+    return utils.get_url(txt_url, transport=transport, priority=PRIORITY)
+
+
+def get_dataset(
+    txt_url, dataset, rename_cols=True, since=None, transport=None, refresh=None
+):
+    """Download and parse a realtime file.
+
+    Args:
+        txt_url (str): Url of the file.
+        dataset (str): Name of the dataset.
+        rename_cols (bool): Rename the columns to more readable titles.
+        since (pd.Timestamp): Only return data at or after this date (UTC).
+            Only the head of the file holding that data is downloaded.
+        transport (Transport): Transport used to retrieve the file.
+        refresh (str): How a file in the disk cache is refreshed, see
+            `utils.get_url`.
+
+    Returns:
+        Pandas dataframe, or None if the file does not exist.
+    """
+
+    if since is None:
+        txt = utils.get_url(
+            txt_url, transport=transport, refresh=refresh, priority=PRIORITY
+        )
+    else:
+        txt = get_recent_text(txt_url, since, transport=transport)
+
+    if not txt:
+        return None
+
+    with metrics.track_parse():
+        df = parse_dataset(txt, dataset, rename_cols=rename_cols)
+
+    if since is not None:
+        df = df[df.index >= since]
+
+    return df
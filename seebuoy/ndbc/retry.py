@@ -0,0 +1,153 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+
+# statuses worth retrying, NDBC returns 503 when it is overloaded
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(requests.RequestException):
+    """Raised instead of making a request while a host is failing."""
+
+    def __init__(self, host, retry_in):
+        super().__init__(
+            f"{host} is failing, not sending requests for {retry_in:.0f} seconds."
+        )
+        self.host = host
+        self.retry_in = retry_in
+
+
+def is_retryable(error, statuses=RETRY_STATUSES):
+    """Whether an error is transient: a timeout, a dropped connection or a
+    status in `statuses`."""
+
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+
+    return getattr(error, "status_code", None) in statuses
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header, either a number of seconds
+    or an HTTP date. None if missing or malformed."""
+
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """How transient errors are retried.
+
+    Retries wait a random time up to `backoff * 2 ** attempt` seconds
+    (exponential backoff with full jitter), so workers that failed together
+    do not retry together. When the server sends a Retry-After header that
+    wait is used instead, unless it is longer than `max_backoff` in which
+    case the error is raised.
+
+    Args:
+        retries (int): Times a request is retried. 0 to never retry.
+        backoff (float): Base wait in seconds.
+        max_backoff (float): Longest wait in seconds.
+        statuses (tuple): HTTP statuses that are retried.
+    """
+
+    def __init__(self, retries=2, backoff=0.5, max_backoff=30, statuses=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.statuses = RETRY_STATUSES if statuses is None else tuple(statuses)
+
+    def delay(self, error, attempt):
+        """Seconds to wait before retrying after `error` on the given attempt
+        (0 for the first retry). None if it should not be retried."""
+
+        if attempt >= self.retries or not is_retryable(error, self.statuses):
+            return None
+
+        retry_after = parse_retry_after(getattr(error, "retry_after", None))
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_backoff else None
+
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+
+class CircuitBreaker:
+    """Fail fast while a host is down.
+
+    After `failure_threshold` transient errors in a row the circuit for the
+    host opens and requests to it raise CircuitOpenError right away instead
+    of piling up. After `reset_timeout` seconds a single trial request is let
+    through: if it succeeds the circuit closes, otherwise it opens again.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the circuit.
+        reset_timeout (float): Seconds the circuit stays open.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        # host -> [consecutive failures, time opened or None, trial running]
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def before(self, host):
+        """Call before a request. Raises CircuitOpenError if the circuit for
+        the host is open. Returns True if the request is the trial, which
+        must be settled with `record_success`, `record_failure` or
+        `end_trial`."""
+
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None or state[1] is None:
+                return False
+
+            retry_in = state[1] + self.reset_timeout - time.monotonic()
+            if retry_in > 0 or state[2]:
+                raise CircuitOpenError(host, max(retry_in, 0))
+
+            # let a single trial request through
+            state[2] = True
+            return True
+
+    def end_trial(self, host):
+        """Let another trial through after one that ended without telling
+        whether the host recovered, e.g. interrupted or a 403."""
+
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None:
+                state[2] = False
+
+    def record_success(self, host):
+        with self._lock:
+            self._hosts.pop(host, None)
+
+    def record_failure(self, host):
+        with self._lock:
+            state = self._hosts.setdefault(host, [0, None, False])
+            state[0] += 1
+            state[2] = False
+            if state[0] >= self.failure_threshold:
+                state[1] = time.monotonic()
+
+    def is_open(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            return state is not None and state[1] is not None
@@ -0,0 +1,437 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+from email.utils import formatdate
+from html import escape
+from urllib.parse import parse_qs, quote, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from .listing import human_size
+
+
+class Response:
+    """Minimal stand-in for `requests.Response` returned by the non-HTTP
+    transports."""
+
+    def __init__(self, url, status_code, content=b"", headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.encoding = "utf-8"
+        self.apparent_encoding = "utf-8"
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i : i + chunk_size]
+
+    def close(self):
+        pass
+
+
+def _apply_range(resp, headers):
+    """Honor a `Range: bytes=start-end` request header on a full response."""
+
+    range_header = (headers or {}).get("Range")
+    if resp.status_code != 200 or not range_header:
+        return resp
+
+    start, _, end = range_header.replace("bytes=", "").partition("-")
+    start = int(start)
+    end = int(end) if end else len(resp.content) - 1
+    total = len(resp.content)
+
+    if start >= total:
+        return Response(resp.url, 416)
+
+    content = resp.content[start : end + 1]
+    headers = dict(resp.headers)
+    headers["Content-Range"] = f"bytes {start}-{start + len(content) - 1}/{total}"
+    headers["Content-Length"] = str(len(content))
+
+    return Response(resp.url, 206, content, headers)
+
+
+class Transport:
+    """Interface used by `utils.get_url` to retrieve files.
+
+    Subclasses implement `get`, which takes the same arguments as
+    `requests.Session.get` (minus the ones seebuoy does not use) and returns
+    an object with `status_code`, `headers`, `content`, `text`,
+    `iter_content` and `close`.
+
+    `remote` is False for transports that do not send requests to NDBC, such
+    as a local mirror. Their requests skip the circuit breaker, the adaptive
+    concurrency limit and the disk cache.
+    """
+
+    remote = True
+
+    def get(self, url, headers=None, stream=False):
+        raise NotImplementedError
+
+    def head(self, url, headers=None):
+        """Return the response headers of `url` without its body."""
+
+        resp = self.get(url, headers=headers, stream=True)
+        resp.close()
+        return resp
+
+    def close(self):
+        pass
+
+
+class HttpTransport(Transport):
+    """Retrieve files from NDBC over HTTP using a pooled keep-alive session.
+
+    Args:
+        pool_size (int): Number of pooled connections kept open per host.
+        keep_alive (bool): Reuse connections between requests.
+        timeout (float or tuple): Seconds to wait for the server. Either a
+            single value or a (connect, read) tuple.
+    """
+
+    def __init__(self, pool_size=10, keep_alive=True, timeout=(10, 60)):
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        if not keep_alive:
+            session.headers["Connection"] = "close"
+
+        self.session = session
+
+    def get(self, url, headers=None, stream=False):
+        return self.session.get(
+            url, headers=headers, timeout=self.timeout, stream=stream
+        )
+
+    def head(self, url, headers=None):
+        return self.session.head(
+            url, headers=headers, timeout=self.timeout, allow_redirects=True
+        )
+
+    def close(self):
+        self.session.close()
+
+
+class HedgedTransport(Transport):
+    """Send a duplicate request when a response is slower than usual.
+
+    The latency of recent requests is tracked, and once a request has been
+    waiting longer than `percentile` of them, the same request is sent again
+    and whichever response arrives first is used. The other one is closed.
+    At most `budget` extra requests are sent per request made, so a slow
+    NDBC is not flooded with duplicates.
+
+    Args:
+        inner (Transport): Transport used to make the requests.
+        percentile (float): Latency percentile after which a request is
+            hedged.
+        budget (float): Extra requests allowed, as a fraction of requests.
+        min_samples (int): Requests to observe before hedging starts.
+        window (int): Number of recent latencies the percentile is taken over.
+        max_workers (int): Threads used to make requests.
+        limit (callable): Returns a context held while a duplicate is in
+            flight, yielding whether it may be sent, e.g.
+            `RateLimiter.try_limit`. Duplicates are sent without limits by
+            default.
+    """
+
+    def __init__(
+        self,
+        inner,
+        percentile=95,
+        budget=0.05,
+        min_samples=20,
+        window=200,
+        max_workers=32,
+        limit=None,
+    ):
+        self.inner = inner
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.limit = limit or _no_limit
+
+        self.requests = 0
+        self.hedged = 0
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="seebuoy-hedge"
+        )
+
+    @property
+    def session(self):
+        return self.inner.session
+
+    @property
+    def remote(self):
+        return self.inner.remote
+
+    def threshold(self):
+        """Seconds after which a request is hedged, None before enough
+        requests have been observed."""
+
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+
+        i = int(len(latencies) * self.percentile / 100)
+        return latencies[min(i, len(latencies) - 1)]
+
+    def _timed_get(self, url, headers, stream):
+        start = time.monotonic()
+        resp = self.inner.get(url, headers=headers, stream=stream)
+        return resp, time.monotonic() - start
+
+    def _may_hedge(self):
+        with self._lock:
+            if self.hedged + 1 > self.budget * self.requests:
+                return False
+            self.hedged += 1
+            return True
+
+    def get(self, url, headers=None, stream=False):
+        with self._lock:
+            self.requests += 1
+
+        threshold = self.threshold()
+        futures = [self._executor.submit(self._timed_get, url, headers, stream)]
+
+        done, _ = wait(futures, timeout=threshold)
+        if not done and self._may_hedge():
+            hedge = self._hedge(url, headers, stream)
+            if hedge is not None:
+                futures.append(hedge)
+
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+
+                resp, latency = future.result()
+                with self._lock:
+                    self._latencies.append(latency)
+                for other in futures:
+                    if other is not future:
+                        other.add_done_callback(_close_response)
+                return resp
+
+        raise error
+
+    def _hedge(self, url, headers, stream):
+        """Send the duplicate of a request, holding its own slot in `limit`
+        until it is done. None if the limit has no room for it."""
+
+        slot = ExitStack()
+        if not slot.enter_context(self.limit()):
+            slot.close()
+            with self._lock:
+                self.hedged -= 1
+            return None
+
+        future = self._executor.submit(self._timed_get, url, headers, stream)
+        future.add_done_callback(lambda _: slot.close())
+        return future
+
+    def head(self, url, headers=None):
+        return self.inner.head(url, headers=headers)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.inner.close()
+
+
+@contextmanager
+def _no_limit():
+    yield True
+
+
+def _close_response(future):
+    if future.exception() is None:
+        future.result()[0].close()
+
+
+def render_listing(path, title):
+    """Render a directory as an Apache autoindex page, the format the
+    listing parsers expect."""
+
+    rows = []
+    for entry in sorted(os.scandir(path), key=lambda e: e.name):
+        if entry.name.startswith("."):
+            continue
+
+        stat = entry.stat()
+        name = entry.name + "/" if entry.is_dir() else entry.name
+        size = "-" if entry.is_dir() else human_size(stat.st_size)
+        modified = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+
+        rows.append(
+            f'<tr><td><a href="{quote(name)}">{escape(name)}</a></td>'
+            f'<td align="right">{modified:%Y-%m-%d %H:%M}  </td>'
+            f'<td align="right">{size}</td><td>&nbsp;</td></tr>'
+        )
+
+    return (
+        f"<html>\n<head><title>Index of {escape(title)}</title></head>\n<body>\n"
+        f"<h1>Index of {escape(title)}</h1>\n<table>\n"
+        "<tr><th>Name</th><th>Last modified</th><th>Size</th>"
+        "<th>Description</th></tr>\n"
+        '<tr><td><a href="../">Parent Directory</a></td><td>&nbsp;</td>'
+        '<td align="right">  - </td><td>&nbsp;</td></tr>\n'
+        + "\n".join(rows)
+        + "\n</table>\n</body></html>\n"
+    )
+
+
+class LocalTransport(Transport):
+    """Read files from a local mirror of NDBC's data/ directory.
+
+    Urls are mapped onto the mirror by their path, so
+    https://www.ndbc.noaa.gov/data/realtime2/41013.txt is read from
+    `<root>/realtime2/41013.txt`. Requests through NDBC's text viewer
+    (view_text_file.php) return the decompressed file, and directories are
+    rendered as listing pages, so the rest of seebuoy works unchanged.
+
+    Args:
+        root (str): Path of the mirrored data/ directory.
+    """
+
+    remote = False
+
+    def __init__(self, root):
+        self.root = os.path.expanduser(root)
+
+    def _local_path(self, url):
+        parsed = urlparse(url)
+
+        if parsed.path.endswith("view_text_file.php"):
+            query = parse_qs(parsed.query)
+            rel_dir = query.get("dir", [""])[0]
+            rel_path = rel_dir.rstrip("/") + "/" + query.get("filename", [""])[0]
+            decompress = True
+        else:
+            rel_path = parsed.path
+            decompress = False
+
+        # strip the leading /data/ so the path is relative to the mirror
+        parts = [p for p in rel_path.split("/") if p]
+        if parts and parts[0] == "data":
+            parts = parts[1:]
+
+        return os.path.join(self.root, *parts), decompress
+
+    def get(self, url, headers=None, stream=False):
+        path, decompress = self._local_path(url)
+
+        if os.path.isdir(path):
+            title = urlparse(url).path
+            content = render_listing(path, title).encode()
+            return Response(url, 200, content, {"Content-Type": "text/html"})
+
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return Response(url, 404)
+
+        if decompress and content[:2] == b"\x1f\x8b":
+            content = gzip.decompress(content)
+
+        resp_headers = {
+            "Last-Modified": formatdate(mtime, usegmt=True),
+            "Content-Length": str(len(content)),
+        }
+        resp = Response(url, 200, content, resp_headers)
+
+        return _apply_range(resp, headers)
+
+
+class FixtureTransport(Transport):
+    """Replay responses recorded on disk.
+
+    Each response is stored as a json file with its status and headers and a
+    file with its body, keyed by url. With `record_from` set, responses that
+    have not been recorded yet are retrieved from that transport and saved,
+    which is how fixtures are created.
+
+    Args:
+        fixture_dir (str): Directory holding the recorded responses.
+        record_from (Transport): Transport used to record missing responses.
+            If None, requesting an unrecorded url raises a LookupError.
+    """
+
+    def __init__(self, fixture_dir, record_from=None):
+        self.fixture_dir = os.path.expanduser(fixture_dir)
+        self.record_from = record_from
+
+    @property
+    def remote(self):
+        return self.record_from is not None and self.record_from.remote
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.fixture_dir, key)
+        return f"{base}.body", f"{base}.json"
+
+    def record(self, url, resp):
+        """Save a response as the fixture for `url`."""
+
+        body_path, meta_path = self._paths(url)
+        os.makedirs(self.fixture_dir, exist_ok=True)
+
+        # the body is stored decoded, so drop headers describing the encoding
+        headers = {
+            k: v
+            for k, v in resp.headers.items()
+            if k.lower() not in ("content-encoding", "transfer-encoding")
+        }
+        meta = {"url": url, "status_code": resp.status_code, "headers": headers}
+        with open(body_path, "wb") as f:
+            f.write(resp.content)
+        with open(meta_path, "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def get(self, url, headers=None, stream=False):
+        body_path, meta_path = self._paths(url)
+
+        if not os.path.exists(meta_path):
+            if self.record_from is None:
+                raise LookupError(f"No fixture recorded for url: \n {url}")
+
+            resp = self.record_from.get(url)
+            self.record(url, resp)
+
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            content = f.read()
+
+        resp = Response(url, meta["status_code"], content, meta["headers"])
+
+        return _apply_range(resp, headers)
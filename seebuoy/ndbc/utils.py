@@ -1,15 +1,926 @@
-import requests
+import io
+import threading
+import time
+import weakref
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from urllib.parse import urlparse
+from . import metrics
+from .cache import DiskCache, NegativeCache, is_immutable
+from .ratelimit import RateLimiter
+from .adaptive import AdaptiveLimit
+from .retry import CircuitBreaker, RetryPolicy, is_retryable
+from .transport import HedgedTransport, HttpTransport
 
 BASE_URL = "https://www.ndbc.noaa.gov/data"
 
+# NDBC's viewer for gzipped files, it returns them decompressed
+VIEW_TEXT_URL = "https://www.ndbc.noaa.gov/view_text_file.php"
 
-def get_url(url):
+# connection pool settings used by the shared session
+POOL_SIZE = 16
+KEEP_ALIVE = True
+TIMEOUT = (10, 60)  # (connect, read) in seconds
 
-    resp = requests.get(url)
-    if resp.status_code == 200:
-        return resp.text
-    elif resp.status_code == 404:
-        print(f"Dataset not available (404 Error) for url: \n {url}")
-        return None
+# opt-in request hedging, see configure_hedging
+HEDGE = None
+
+GZIP_MAGIC = b"\x1f\x8b"
+CHUNK_SIZE = 64 * 1024
+
+# requests waiting for a slot go out lowest priority first, see limited.
+# realtime polling goes ahead of current year and historical backfills
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# ways a file already in the disk cache can be refreshed, see _load_cached
+REFRESH_MODES = (None, "if-changed")
+
+# number of threads used when pulling many files. How many of them download
+# at once is adjusted by the adaptive limit, see configure_adaptive_limit
+MAX_WORKERS = 16
+
+_transport = None
+_transport_lock = threading.Lock()
+
+# opt-in disk cache, see configure_cache
+_cache = None
+
+# urls known to 404 on NDBC, see configure_negative_cache. Transports passed
+# in explicitly, e.g. a LocalTransport, each get their own, see missing_urls
+_missing = NegativeCache(ttl=3600)
+_transport_missing = weakref.WeakKeyDictionary()
+_missing_lock = threading.Lock()
+
+# opt-in request rate limit, see configure_rate_limit
+_limiter = None
+
+# requests in flight, adjusted from NDBC's latency and errors
+_adaptive = AdaptiveLimit(initial=4, max_limit=MAX_WORKERS)
+
+# transient errors are retried, and a failing host is given a rest, see
+# configure_retries
+_retry = RetryPolicy()
+_breaker = CircuitBreaker()
+
+
+class HTTPStatusError(ValueError):
+    """Raised when NDBC responds with an unexpected HTTP status."""
+
+    def __init__(self, url, status_code, retry_after=None):
+        super().__init__(f"Error code {status_code} for url: \n {url}")
+        self.url = url
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class NotFound:
+    """Returned in place of a file's text when NDBC has no file at the url.
+
+    It is falsy, so callers can test the result with `if not txt`.
+
+    Attributes:
+        url (str): The url that was requested.
+        status_code (int): The HTTP status returned (404).
+        cached (bool): True when the url was already known to be missing and
+            no request was made.
+    """
+
+    def __init__(self, url, status_code=404, cached=False):
+        self.url = url
+        self.status_code = status_code
+        self.cached = cached
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return f"NotFound({self.url!r}, status_code={self.status_code})"
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key.
+
+    The first caller for a key runs the function. Callers arriving while it
+    is still running wait for it and receive the same result (or exception)
+    instead of repeating the work.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+# shared by every download so identical in-flight requests are made once
+flights = SingleFlight()
+
+
+def configure_session(pool_size=None, keep_alive=None, timeout=None):
+    """Configure the HTTP session shared by every request to NDBC.
+
+    The session is rebuilt on the next request so the new settings take
+    effect immediately.
+
+    Args:
+        pool_size (int): Number of pooled connections kept open per host.
+        keep_alive (bool): Reuse connections between requests. When False,
+            each request closes its connection once it is done.
+        timeout (float or tuple): Seconds to wait for the server. Either a
+            single value or a (connect, read) tuple.
+    """
+    global POOL_SIZE, KEEP_ALIVE, TIMEOUT, _transport
+
+    with _transport_lock:
+        if pool_size is not None:
+            POOL_SIZE = pool_size
+        if keep_alive is not None:
+            KEEP_ALIVE = keep_alive
+        if timeout is not None:
+            TIMEOUT = timeout
+
+        if _transport is not None:
+            _transport.close()
+        _transport = None
+
+
+def configure_hedging(percentile=95, budget=0.05):
+    """Hedge slow requests made by the shared session.
+
+    When a request takes longer than `percentile` of recent requests, a
+    duplicate is sent and the first response to arrive is used, so one
+    stalled response does not hold up a whole `get_data` call. Duplicates
+    take a token and connection from `configure_rate_limit` like any other
+    request, and are not sent when none is free right away.
+
+    Args:
+        percentile (float): Latency percentile after which a request is
+            hedged. Pass None to turn hedging off.
+        budget (float): Extra requests allowed, as a fraction of requests
+            made, e.g. 0.05 for at most one duplicate per 20 requests.
+    """
+    global HEDGE, _transport
+
+    with _transport_lock:
+        if percentile is None:
+            HEDGE = None
+        else:
+            HEDGE = {"percentile": percentile, "budget": budget}
+
+        if _transport is not None:
+            _transport.close()
+        _transport = None
+
+
+def get_transport():
+    """Return the default transport, an HttpTransport using the settings from
+    `configure_session`, hedged if `configure_hedging` was called. It is
+    created on first use."""
+    global _transport
+
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                transport = HttpTransport(
+                    pool_size=POOL_SIZE, keep_alive=KEEP_ALIVE, timeout=TIMEOUT
+                )
+                if HEDGE is not None:
+                    transport = HedgedTransport(transport, limit=_hedge_limit, **HEDGE)
+                _transport = transport
+
+    return _transport
+
+
+@contextmanager
+def _hedge_limit():
+    # a duplicate request is only worth sending if it does not have to wait
+    if _limiter is None:
+        yield True
+    else:
+        with _limiter.try_limit() as allowed:
+            yield allowed
+
+
+def get_session():
+    """Return the session of the default transport."""
+    return get_transport().session
+
+
+def configure_cache(cache_dir=None, ttl=3600):
+    """Turn on the on-disk HTTP cache used by `get_url`.
+
+    Responses are keyed by URL and stored with their ETag/Last-Modified
+    validators. Within `ttl` a cached response is returned without contacting
+    NDBC; afterwards it is revalidated with a conditional GET. Yearly files
+    under data/historical never change and are never re-fetched, their
+    listings expire like any other response. Only responses from NDBC are
+    cached, not files read through a LocalTransport or replayed fixtures.
+
+    Args:
+        cache_dir (str): Directory in which to store responses. Pass None to
+            turn the cache off.
+        ttl (float): Seconds a cached response is used before revalidating.
+    """
+    global _cache
+
+    if cache_dir is None:
+        _cache = None
+    else:
+        _cache = DiskCache(cache_dir, ttl=ttl)
+
+
+def disk_cache(transport=None):
+    """The disk cache set by `configure_cache` for requests through
+    `transport`. None for transports that are not remote, so files read from
+    e.g. a local mirror are never stored or served as NDBC's."""
+
+    return _cache if is_remote(transport) else None
+
+
+def configure_negative_cache(ttl=3600, path=None):
+    """Configure how urls that returned 404 are remembered.
+
+    Known-missing urls are not requested again until `ttl` expires; `get_url`
+    returns a NotFound for them straight away.
+
+    Args:
+        ttl (float): Seconds a url is considered missing. Pass 0 to always
+            request the url again.
+        path (str): Optional file in which to persist the missing urls, one
+            json line each, so other processes and later runs skip them too.
+    """
+    global _missing, _transport_missing
+
+    with _missing_lock:
+        _missing = NegativeCache(ttl=ttl, path=path)
+        _transport_missing = weakref.WeakKeyDictionary()
+
+
+def missing_urls(transport=None):
+    """The urls known to 404 for a transport.
+
+    The default transport uses the cache set by `configure_negative_cache`.
+    Any other transport keeps its own in memory, so files missing from e.g. a
+    partial local mirror are not taken to be missing on NDBC.
+    """
+
+    if transport is None:
+        return _missing
+
+    with _missing_lock:
+        missing = _transport_missing.get(transport)
+        if missing is None:
+            missing = _transport_missing[transport] = NegativeCache(ttl=_missing.ttl)
+        return missing
+
+
+def configure_rate_limit(rate=None, burst=None, max_connections=None, lock_dir=None):
+    """Limit the requests made to NDBC.
+
+    The limits are shared by all threads, and with `lock_dir` set by all
+    processes on the host using the same directory, so a pool of workers
+    stays under NDBC's throttling as a whole.
+
+    Args:
+        rate (float): Requests per second. None for no rate limit.
+        burst (int): Requests allowed at once after being idle. Defaults to
+            `rate`.
+        max_connections (int): Maximum number of requests in flight.
+        lock_dir (str): Directory for the lock files shared between
+            processes.
+    """
+    global _limiter
+
+    if rate is None and max_connections is None:
+        _limiter = None
+    else:
+        _limiter = RateLimiter(
+            rate=rate, burst=burst, max_connections=max_connections, lock_dir=lock_dir
+        )
+
+
+def configure_adaptive_limit(initial=4, min_limit=1, max_limit=None):
+    """Configure how many requests are allowed in flight at once.
+
+    The limit adapts to NDBC: it grows while latency stays flat and shrinks
+    when latency rises or requests time out or fail with a 5xx, so bulk
+    downloads run as fast as NDBC sustains. Pass `initial=None` to turn it
+    off and only rely on the number of workers.
+
+    Args:
+        initial (int): Starting number of requests in flight.
+        min_limit (int): Lowest the limit can go.
+        max_limit (int): Highest the limit can go. Defaults to MAX_WORKERS.
+    """
+    global _adaptive
+
+    if initial is None:
+        _adaptive = None
+    else:
+        _adaptive = AdaptiveLimit(
+            initial=initial, min_limit=min_limit, max_limit=max_limit or MAX_WORKERS
+        )
+
+
+def configure_retries(
+    retries=2,
+    backoff=0.5,
+    max_backoff=30,
+    failure_threshold=5,
+    reset_timeout=30,
+):
+    """Configure how requests that fail with a transient error are retried.
+
+    Timeouts, dropped connections and 429/5xx responses are retried with
+    jittered exponential backoff, waiting as long as NDBC asks for in a
+    Retry-After header. After `failure_threshold` such errors in a row, NDBC
+    is considered down: for `reset_timeout` seconds requests fail right away
+    with a CircuitOpenError rather than piling up, then a single trial
+    request decides whether to resume.
+
+    Args:
+        retries (int): Times a request is retried. 0 to never retry.
+        backoff (float): Base wait in seconds, doubled after each retry.
+        max_backoff (float): Longest wait in seconds. A longer Retry-After
+            raises the error instead.
+        failure_threshold (int): Consecutive failures after which requests
+            fail fast. None to never fail fast.
+        reset_timeout (float): Seconds requests fail fast for.
+    """
+    global _retry, _breaker
+
+    _retry = RetryPolicy(retries=retries, backoff=backoff, max_backoff=max_backoff)
+    if failure_threshold is None:
+        _breaker = None
+    else:
+        _breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+
+def is_remote(transport):
+    """Whether requests through `transport` go to NDBC, as opposed to e.g. a
+    LocalTransport reading a mirror. None stands for the default transport."""
+
+    return transport is None or getattr(transport, "remote", True)
+
+
+def with_retries(url, func, event=None, transport=None):
+    """Call `func`, which makes a request to `url`, retrying it on transient
+    errors as set by `configure_retries`. The retries are counted in the
+    metrics `event`.
+
+    The circuit breaker only applies to remote `transport`s, so a local
+    mirror keeps working while NDBC is down.
+    """
+
+    host = urlparse(url).netloc
+    attempt = 0
+
+    while True:
+        breaker = _breaker if is_remote(transport) else None
+        trial = breaker is not None and breaker.before(host)
+
+        try:
+            result = func()
+        except Exception as e:
+            retryable = is_retryable(e, _retry.statuses)
+            if breaker is not None and retryable:
+                breaker.record_failure(host)
+                trial = False
+
+            delay = _retry.delay(e, attempt) if retryable else None
+            if delay is None:
+                raise
+
+            attempt += 1
+            if event is not None:
+                event.retries = attempt
+            time.sleep(delay)
+
+        else:
+            if breaker is not None:
+                breaker.record_success(host)
+                trial = False
+            return result
+
+        finally:
+            # a trial that failed for another reason does not block the host
+            if trial:
+                breaker.end_trial(host)
+
+
+@contextmanager
+def limited(priority=PRIORITY_NORMAL, event=None, transport=None):
+    """Context to make a request to NDBC in. Waits for the adaptive
+    concurrency limit and the rate limit set by `configure_rate_limit`.
+
+    While requests are waiting for the concurrency limit, those with a lower
+    `priority` go first, e.g. PRIORITY_HIGH ahead of PRIORITY_LOW.
+
+    The adaptive limit is fed the time to first byte recorded in the metrics
+    `event`, so neither the wait for the rate limit nor the size of the file
+    count as latency. Without an event the time spent in the context, once
+    the rate limit let the request through, is used. Requests through a
+    `transport` that is not remote, e.g. a local mirror, say nothing about
+    NDBC and skip the adaptive limit.
+    """
+
+    with ExitStack() as stack:
+        sample = None
+        if _adaptive is not None and is_remote(transport):
+            sample = stack.enter_context(_adaptive.track(priority))
+        if _limiter is not None:
+            stack.enter_context(_limiter.limit())
+        if sample is not None:
+            sample.start()
+
+        yield
+
+        if sample is not None and event is not None and event.ttfb is not None:
+            sample.latency = event.ttfb
+
+
+def check_refresh(refresh):
+    if refresh not in REFRESH_MODES:
+        raise ValueError(f"refresh must be one of {list(REFRESH_MODES)}.")
+
+
+def _load_cached(url, transport=None, refresh=None, priority=PRIORITY_NORMAL):
+    """Returns (entry, fresh) for `url` from the disk cache.
+
+    By default an entry is fresh for the cache's ttl. With
+    `refresh="if-changed"` the ttl is ignored and NDBC is asked for the file's
+    headers with a HEAD request instead: the entry is fresh if its
+    Last-Modified and Content-Length did not change. Entries stored without
+    those headers, such as directory listings, keep using the ttl.
+    """
+
+    cache = disk_cache(transport)
+    if cache is None:
+        return None, False
+
+    entry = cache.load(url)
+    if entry is None:
+        return None, False
+
+    probe = entry.last_modified is not None and entry.content_length is not None
+    if refresh == "if-changed" and probe and not is_immutable(url):
+        return entry, _probe_unchanged(url, entry, transport, priority)
+
+    return entry, cache.is_fresh(entry)
+
+
+def _probe_unchanged(url, entry, transport, priority=PRIORITY_NORMAL):
+    def head():
+        with limited(priority, event, transport):
+            event.sent()
+            resp = transport.head(url)
+            event.received(resp)
+
+        if resp.status_code >= 500 or resp.status_code == 429:
+            raise HTTPStatusError(url, resp.status_code)
+        return resp
+
+    with metrics.track(url, method="HEAD", cache="bypass") as event:
+        resp = with_retries(url, head, event, transport)
+
+        if resp.status_code != 200 or not entry.unchanged(resp.headers):
+            return False
+        event.cache = "revalidated"
+
+    _cache.touch(entry)
+    return True
+
+
+def _request(url, transport, entry=None, stream=False, event=None):
+    """GET `url`, conditionally if there is a cached `entry`.
+
+    Returns (entry, resp). `entry` is set when the conditional GET came back
+    304 and the cached copy can be used, otherwise `resp` is the response.
+    The request is recorded in the metrics `event`.
+    """
+
+    headers = entry.validators() if entry is not None else {}
+
+    event.sent()
+    resp = transport.get(url, headers=headers, stream=stream)
+    event.received(resp)
+
+    if resp.status_code == 304 and entry is not None:
+        resp.close()
+        _cache.touch(entry)
+        event.cache = "revalidated"
+        return entry, None
+
+    return None, resp
+
+
+def _handle_error(url, resp, missing):
+
+    if resp.status_code == 404:
+        missing.add(url)
+        return NotFound(url, resp.status_code)
     else:
-        raise ValueError(f"Error code {resp.status_code} for url: \n {url}")
+        retry_after = resp.headers.get("Retry-After")
+        raise HTTPStatusError(url, resp.status_code, retry_after)
+
+
+def get_url(url, transport=None, refresh=None, priority=PRIORITY_NORMAL):
+    """Download a file as text. Concurrent calls for the same url share a
+    single download.
+
+    Args:
+        url (str): Url of the file.
+        transport (Transport): Transport used to retrieve the file. Defaults
+            to the shared HttpTransport.
+        refresh (str): How a file in the disk cache is refreshed. None to
+            use it until the cache's ttl expires, "if-changed" to check with
+            a HEAD request whether it changed on NDBC.
+        priority (int): Priority of the request when waiting for a slot, one
+            of PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW.
+
+    Returns:
+        The text of the file, or a NotFound if NDBC does not have it.
+    """
+
+    missing = missing_urls(transport)
+    if url in missing:
+        return NotFound(url, cached=True)
+
+    transport = transport or get_transport()
+    key = ("get_url", url, transport, refresh)
+    return flights.do(key, _get_url, url, transport, missing, refresh, priority)
+
+
+def _get_url(url, transport, missing, refresh=None, priority=PRIORITY_NORMAL):
+
+    with metrics.track(url) as event:
+        entry, fresh = _load_cached(url, transport, refresh, priority)
+        if fresh:
+            event.cache = "hit"
+            return entry.text
+
+        def get():
+            with limited(priority, event, transport):
+                cached, resp = _request(url, transport, entry, event=event)
+                if cached is not None:
+                    return cached.text
+
+                event.n_bytes = len(resp.content)
+                if resp.status_code == 200:
+                    cache = disk_cache(transport)
+                    if cache is not None:
+                        encoding = resp.encoding or resp.apparent_encoding
+                        cache.store(url, resp.content, resp.headers, encoding=encoding)
+                    return resp.text
+                else:
+                    return _handle_error(url, resp, missing)
+
+        return with_retries(url, get, event, transport)
+
+
+def get_url_head(url, n_bytes, transport=None, priority=PRIORITY_NORMAL):
+    """Download the first `n_bytes` of a file using an HTTP Range request.
+
+    The disk cache is bypassed since only part of the file is returned.
+
+    Returns:
+        (txt, complete) where `complete` is True when the whole file was
+        returned, either because it is smaller than `n_bytes` or because the
+        server ignored the range.
+    """
+
+    missing = missing_urls(transport)
+    if url in missing:
+        return NotFound(url, cached=True), True
+
+    transport = transport or get_transport()
+    headers = {"Range": f"bytes=0-{n_bytes - 1}"}
+
+    def get():
+        with limited(priority, event, transport):
+            event.sent()
+            resp = transport.get(url, headers=headers)
+            event.received(resp)
+            event.n_bytes = len(resp.content)
+            txt = resp.text
+
+            if resp.status_code == 206:
+                # Content-Range: bytes 0-1023/146515, or bytes 0-1023/* when
+                # the length is unknown. Fewer bytes than asked for is the
+                # end of the file either way
+                total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+                short = len(resp.content) < n_bytes
+                complete = short or (total.isdigit() and int(total) <= n_bytes)
+                return txt, complete
+            elif resp.status_code == 200:
+                return txt, True
+            elif resp.status_code == 416:
+                # the file is empty
+                return "", True
+            else:
+                return _handle_error(url, resp, missing), True
+
+    with metrics.track(url, cache="bypass") as event:
+        return with_retries(url, get, event, transport)
+
+
+def head_url(url, transport=None, priority=PRIORITY_NORMAL):
+    """Check whether a file exists with a HEAD request, without downloading
+    it.
+
+    Returns:
+        The response headers, or a NotFound if NDBC has no file at the url.
+    """
+
+    missing = missing_urls(transport)
+    if url in missing:
+        return NotFound(url, cached=True)
+
+    transport = transport or get_transport()
+
+    def head():
+        with limited(priority, event, transport):
+            event.sent()
+            resp = transport.head(url)
+            event.received(resp)
+
+        if resp.status_code != 200:
+            return _handle_error(url, resp, missing)
+        return resp.headers
+
+    with metrics.track(url, method="HEAD", cache="bypass") as event:
+        return with_retries(url, head, event, transport)
+
+
+def head_urls(urls, transport=None, priority=PRIORITY_NORMAL, max_workers=None):
+    """`head_url` for many urls at once. Results are in the order of `urls`."""
+
+    def head(url):
+        return head_url(url, transport=transport, priority=priority)
+
+    return map_concurrent(head, urls, max_workers=max_workers)
+
+
+def head_until_missing(
+    groups, max_misses=None, transport=None, priority=PRIORITY_NORMAL, max_workers=None
+):
+    """`head_url` for candidate files, newest first, giving up once none of
+    the files of `max_misses` groups in a row exist.
+
+    The groups of every key are checked a batch of `max_misses` at a time,
+    the batches of all keys concurrently.
+
+    Args:
+        groups (dict): Per key, e.g. a dataset, a list of groups of urls
+            ordered newest first, e.g. one group per year.
+        max_misses (int): Number of groups in a row without any file after
+            which the older groups of a key are skipped. None to check every
+            group.
+
+    Returns:
+        Dict of the response headers, or a NotFound, of each url checked.
+    """
+
+    found = {}
+    misses = dict.fromkeys(groups, 0)
+    pending = {key: list(key_groups) for key, key_groups in groups.items()}
+
+    while pending:
+        batches = {
+            key: key_groups[:max_misses] if max_misses else key_groups
+            for key, key_groups in pending.items()
+        }
+        urls = [url for batch in batches.values() for group in batch for url in group]
+        headers = head_urls(urls, transport, priority, max_workers=max_workers)
+        found.update(zip(urls, headers))
+
+        for key, batch in batches.items():
+            for group in batch:
+                if any(found[url] for url in group):
+                    misses[key] = 0
+                else:
+                    misses[key] += 1
+
+            pending[key] = pending[key][len(batch) :]
+            if not pending[key] or (max_misses and misses[key] >= max_misses):
+                del pending[key]
+
+    return found
+
+
+def gunzip_chunks(chunks):
+    """Decompress gzipped data as it arrives.
+
+    Handles files made of several gzip members. Data that is not gzipped (for
+    example when the server already decoded it) is passed through untouched.
+
+    Args:
+        chunks (iterable): Chunks of bytes.
+    """
+
+    decompressor = None
+    passthrough = False
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+
+        if decompressor is None and not passthrough:
+            if chunk[:2] == GZIP_MAGIC:
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                passthrough = True
+
+        if passthrough:
+            yield chunk
+            continue
+
+        while chunk:
+            yield decompressor.decompress(chunk)
+            chunk = decompressor.unused_data
+            if decompressor.eof:
+                # start of another gzip member
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    if decompressor is not None:
+        yield decompressor.flush()
+
+
+class ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterable of bytes chunks.
+
+    Args:
+        chunks (iterable): Chunks of bytes.
+        on_close (callable): Called when the file is closed, e.g. to release
+            the connection the chunks are read from.
+    """
+
+    def __init__(self, chunks, on_close=None):
+        self._chunks = iter(chunks)
+        self._pending = b""
+        self._on_close = on_close
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._pending:
+            self._pending = next(self._chunks, None)
+            if self._pending is None:
+                self._pending = b""
+                return 0
+
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        if not self.closed and self._on_close is not None:
+            self._on_close()
+        super().close()
+
+
+def _text_stream(chunks, on_close=None):
+    raw = io.BufferedReader(ChunkReader(chunks, on_close), CHUNK_SIZE)
+    return io.TextIOWrapper(raw, encoding="utf-8", errors="replace")
+
+
+def _stream_body(url, resp, event, cache=None):
+    """Yield the body of a streamed response, storing it in the disk `cache`
+    once it has been read entirely."""
+
+    body = [] if cache is not None else None
+    try:
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            event.n_bytes += len(chunk)
+            if body is not None:
+                body.append(chunk)
+            yield chunk
+    except Exception as e:
+        event.finish(error=e)
+        raise
+
+    if body is not None:
+        cache.store(url, b"".join(body), resp.headers)
+    event.finish()
+
+
+def open_gzip_url(url, transport=None, refresh=None, priority=PRIORITY_NORMAL):
+    """Open a gzipped file as a text stream, decompressed as it is read.
+
+    The file never sits in memory as a whole, so it can be passed straight to
+    `pd.read_csv`. The connection, and its slot in the limits set by
+    `configure_rate_limit` and `configure_adaptive_limit`, are held until the
+    stream is closed. The compressed bytes go in the disk cache once the
+    stream has been read to the end.
+
+    Args:
+        url (str): Url of the file.
+        transport (Transport): Transport used to retrieve the file.
+        refresh (str): How a file in the disk cache is refreshed, see
+            `get_url`.
+        priority (int): Priority of the request, see `get_url`.
+
+    Returns:
+        A text file object, or a NotFound if NDBC does not have the file.
+    """
+
+    missing = missing_urls(transport)
+    if url in missing:
+        return NotFound(url, cached=True)
+
+    transport = transport or get_transport()
+
+    def get():
+        with ExitStack() as stack:
+            stack.enter_context(limited(priority, event, transport))
+            cached, resp = _request(url, transport, entry, True, event)
+
+            if cached is None and resp.status_code != 200:
+                resp.close()
+                return _handle_error(url, resp, missing), None, None
+
+            if cached is not None:
+                return cached, None, None
+
+            # the body is still to come, so the slot is held until the
+            # stream is closed
+            return None, resp, stack.pop_all()
+
+    # the event is reported once the stream is read, not when this returns
+    event = metrics.RequestEvent(url)
+    try:
+        entry, fresh = _load_cached(url, transport, refresh, priority)
+        if fresh:
+            event.cache = "hit"
+        else:
+            entry, resp, slot = with_retries(url, get, event, transport)
+
+    except Exception as e:
+        event.finish(error=e)
+        raise
+
+    if isinstance(entry, NotFound):
+        event.finish()
+        return entry
+
+    if entry is None:
+
+        def close():
+            resp.close()
+            slot.close()
+            event.finish()
+
+        cache = disk_cache(transport)
+        chunks = gunzip_chunks(_stream_body(url, resp, event, cache))
+        return _text_stream(chunks, on_close=close)
+
+    event.finish()
+    return _text_stream(gunzip_chunks([entry.body]))
+
+
+def map_concurrent(func, items, max_workers=None):
+    """Apply `func` to every item using a bounded pool of threads.
+
+    Results are returned in the same order as `items`, so callers can treat
+    this as a drop-in replacement for a list comprehension.
+
+    Args:
+        func (callable): Function taking a single item.
+        items (iterable): Items to process.
+        max_workers (int): Maximum number of items processed at once. Defaults
+            to MAX_WORKERS. Pass 1 to process the items serially.
+    """
+
+    items = list(items)
+    max_workers = min(max_workers or MAX_WORKERS, len(items))
+
+    if max_workers <= 1:
+        return [func(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(func, items))
@@ -0,0 +1,147 @@
+import gzip
+import weakref
+import pytest
+from seebuoy.ndbc import current_year, utils
+from seebuoy.ndbc.adaptive import AdaptiveLimit
+from seebuoy.ndbc.cache import NegativeCache
+from seebuoy.ndbc.retry import CircuitBreaker
+from seebuoy.ndbc.transport import LocalTransport, Response
+
+STANDARD_TXT = """\
+#YY  MM DD hh mm WDIR WSPD GST  WVHT   DPD   APD MWD   PRES  ATMP  WTMP  DEWP  VIS PTDY  TIDE
+#yr  mo dy hr mn degT m/s  m/s     m   sec   sec degT   hPa  degC  degC  degC  nmi  hPa    ft
+2023 01 05 12 50 200  5.0  6.0   1.2     8   5.1 190 1015.0  20.1  21.0  15.0   MM -1.0    MM
+2023 01 05 12 40 210  5.5  7.0    MM    MM    MM  MM 1015.1  20.0  21.0  15.1   MM   MM    MM
+2023 01 05 12 30 220  6.0  7.5   1.3     9   5.2 200 1015.2  20.0  21.0  15.2   MM   MM    MM
+"""
+
+HISTORICAL_TXT = """\
+#YY  MM DD hh mm WDIR WSPD GST  WVHT   DPD   APD MWD   PRES  ATMP  WTMP  DEWP  VIS  TIDE
+#yr  mo dy hr mn degT m/s  m/s     m   sec   sec degT   hPa  degC  degC  degC  mi    ft
+2020 01 01 00 00 200  5.0  6.0  1.20  8.00  5.10 190 1015.0  20.1  21.0  15.0 99.0 99.00
+2020 01 01 01 00 210  5.5  7.0  1.30  9.00  5.20 200 1015.1  20.0  21.0  15.1 99.0 99.00
+"""
+
+
+@pytest.fixture(autouse=True)
+def reset_request_state(monkeypatch):
+    """Give every test a fresh circuit breaker, adaptive limit and negative
+    cache, so failures in one test do not leak into the next."""
+
+    monkeypatch.setattr(utils, "_breaker", CircuitBreaker())
+    monkeypatch.setattr(
+        utils, "_adaptive", AdaptiveLimit(initial=4, max_limit=utils.MAX_WORKERS)
+    )
+    monkeypatch.setattr(utils, "_missing", NegativeCache(ttl=3600))
+    monkeypatch.setattr(utils, "_transport_missing", weakref.WeakKeyDictionary())
+
+
+def make_listing(files):
+    """Render an Apache autoindex page like the ones served by NDBC.
+
+    Args:
+        files (list): (file_name, last_modified, size) tuples.
+    """
+
+    rows = [
+        '<tr><td valign="top"><img src="/icons/back.gif" alt="[PARENTDIR]"></td>'
+        '<td><a href="/data/">Parent Directory</a></td><td>&nbsp;</td>'
+        '<td align="right">  - </td><td>&nbsp;</td></tr>'
+    ]
+    for name, last_modified, size in files:
+        rows.append(
+            '<tr><td valign="top"><img src="/icons/text.gif" alt="[TXT]"></td>'
+            f'<td><a href="{name}">{name}</a></td>'
+            f'<td align="right">{last_modified}  </td>'
+            f'<td align="right">{size:>4}</td><td>&nbsp;</td></tr>'
+        )
+
+    return (
+        '<!DOCTYPE HTML PUBLIC "-//W3C//DTD HTML 3.2 Final//EN">\n'
+        "<html>\n <head>\n  <title>Index of /data</title>\n </head>\n <body>\n"
+        "<h1>Index of /data</h1>\n  <table>\n"
+        '   <tr><th valign="top"><img src="/icons/blank.gif" alt="[ICO]"></th>'
+        '<th><a href="?C=N;O=D">Name</a></th><th><a href="?C=M;O=A">Last modified</a>'
+        '</th><th><a href="?C=S;O=A">Size</a></th><th><a href="?C=D;O=A">Description'
+        "</a></th></tr>\n"
+        '   <tr><th colspan="5"><hr></th></tr>\n'
+        + "\n".join(rows)
+        + '\n   <tr><th colspan="5"><hr></th></tr>\n</table>\n</body></html>\n'
+    )
+
+
+@pytest.fixture
+def realtime_listing():
+    return make_listing(
+        [
+            ("41013.spec", "2023-01-05 13:05", "12K"),
+            ("41013.txt", "2023-01-05 13:05", "1.1M"),
+            ("41025.txt", "2023-01-05 13:01", "1.0M"),
+        ]
+    )
+
+
+@pytest.fixture
+def mirror(tmp_path):
+
+    (tmp_path / "realtime2").mkdir()
+    (tmp_path / "realtime2" / "41013.txt").write_text(STANDARD_TXT)
+
+    (tmp_path / "historical" / "stdmet").mkdir(parents=True)
+    gz_path = tmp_path / "historical" / "stdmet" / "41013h2020.txt.gz"
+    gz_path.write_bytes(gzip.compress(HISTORICAL_TXT.encode()))
+
+    for month in current_year.MONTHS:
+        (tmp_path / "stdmet" / month).mkdir(parents=True)
+
+    return tmp_path
+
+
+class CountingTransport(LocalTransport):
+    """A mirror standing in for NDBC, so the disk cache and limits apply,
+    recording the requests made."""
+
+    remote = True
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.gets = []
+        self.heads = []
+
+    def get(self, url, headers=None, stream=False):
+        self.gets.append(url)
+        return super().get(url, headers=headers, stream=stream)
+
+    def head(self, url, headers=None):
+        self.heads.append(url)
+        resp = super().get(url, headers=headers)
+        return Response(url, resp.status_code, b"", resp.headers)
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.encoding = "utf-8"
+        self.apparent_encoding = "utf-8"
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+    def iter_content(self, chunk_size):
+        yield self.content
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.calls.append(headers)
+        return self.responses.pop(0)
@@ -0,0 +1,156 @@
+import threading
+import time
+import pytest
+import requests
+from seebuoy.ndbc import metrics, utils
+from seebuoy.ndbc.adaptive import AdaptiveLimit
+from seebuoy.ndbc.transport import LocalTransport
+
+
+def test_limit_grows_while_latency_is_flat():
+    limit = AdaptiveLimit(initial=2, max_limit=4)
+
+    for _ in range(50):
+        limit.acquire()
+        limit.release(latency=0.1)
+
+    assert limit.limit == 4
+
+
+def test_limit_backs_off_when_slow_or_overloaded():
+    limit = AdaptiveLimit(initial=8, max_limit=16)
+
+    limit.acquire()
+    limit.release(latency=0.1)
+    limit.acquire()
+    limit.release(latency=1.0)
+    assert 7 < limit.limit < 8.2
+
+    with pytest.raises(requests.Timeout):
+        with limit.track():
+            raise requests.Timeout()
+    assert limit.limit < 4.5
+
+    # errors unrelated to load leave the limit alone
+    before = limit.limit
+    with pytest.raises(KeyError):
+        with limit.track():
+            raise KeyError()
+    assert limit.limit == before
+
+
+def test_server_errors_count_as_overload():
+    limit = AdaptiveLimit(initial=8)
+
+    with pytest.raises(utils.HTTPStatusError):
+        with limit.track():
+            raise utils.HTTPStatusError("url", 503)
+    assert limit.limit == 4
+
+    with pytest.raises(utils.HTTPStatusError):
+        with limit.track():
+            raise utils.HTTPStatusError("url", 403)
+    assert limit.limit == 4
+
+
+def test_in_flight_never_exceeds_limit():
+    limit = AdaptiveLimit(initial=2, max_limit=2)
+    lock = threading.Lock()
+    peak = [0]
+
+    def work(_):
+        with limit.track():
+            with lock:
+                peak[0] = max(peak[0], limit.in_flight)
+
+    utils.map_concurrent(work, range(20), max_workers=8)
+
+    assert peak[0] <= 2
+    assert limit.in_flight == 0
+
+
+def test_configure_adaptive_limit(monkeypatch):
+    monkeypatch.setattr(utils, "_adaptive", utils._adaptive)
+
+    utils.configure_adaptive_limit(initial=None)
+    with utils.limited():
+        pass
+    assert utils._adaptive is None
+
+    utils.configure_adaptive_limit(initial=2, max_limit=3)
+    assert utils._adaptive.limit == 2
+    assert utils._adaptive.max_limit == 3
+
+
+def test_waiters_go_by_priority():
+    limit = AdaptiveLimit(initial=1, max_limit=1)
+    order = []
+
+    def wait(priority, name):
+        with limit.track(priority):
+            order.append(name)
+
+    limit.acquire()
+    threads = []
+    for priority, name in [(2, "historical"), (2, "historical 2"), (0, "real_time")]:
+        thread = threading.Thread(target=wait, args=(priority, name))
+        thread.start()
+        threads.append(thread)
+        while len(limit._waiting) < len(threads):
+            time.sleep(0.001)
+
+    limit.release()
+    for thread in threads:
+        thread.join()
+
+    assert order == ["real_time", "historical", "historical 2"]
+
+
+def test_latency_is_time_to_first_byte(monkeypatch):
+    monkeypatch.setattr(utils, "_adaptive", AdaptiveLimit(initial=4, max_limit=8))
+    event = metrics.RequestEvent("url")
+
+    for delay in [0, 0.05]:
+        # a slow body read after fast headers is not NDBC slowing down
+        with utils.limited(event=event):
+            event.ttfb = 0.001
+            time.sleep(delay)
+
+    assert utils._adaptive.baseline == 0.001
+    assert utils._adaptive.limit > 4.4
+
+
+def test_rate_limit_wait_is_not_latency():
+    limit = AdaptiveLimit(initial=4, max_limit=8)
+
+    with limit.track():
+        time.sleep(0.02)
+    with limit.track() as sample:
+        # e.g. waiting for a rate limit token
+        time.sleep(0.1)
+        sample.start()
+        time.sleep(0.02)
+
+    assert limit.limit > 4.4
+
+
+def test_baseline_is_recent():
+    limit = AdaptiveLimit(initial=4, max_limit=8, window=10)
+
+    for latency in [0.0001] * 5 + [0.05] * 20:
+        limit.acquire()
+        limit.release(latency=latency)
+
+    # the fast responses are forgotten and steady ones are not congestion
+    assert limit.baseline == 0.05
+    assert limit.limit > 4
+
+
+def test_local_transport_not_sampled(monkeypatch, mirror):
+    monkeypatch.setattr(utils, "_adaptive", AdaptiveLimit(initial=4))
+
+    url = f"{utils.BASE_URL}/realtime2/41013.txt"
+    for _ in range(5):
+        utils.get_url(url, transport=LocalTransport(mirror))
+
+    assert utils._adaptive.baseline is None
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from seebuoy import AsyncNDBC
+from seebuoy.ndbc import metrics, utils
+from conftest import STANDARD_TXT
+
+web = pytest.importorskip("aiohttp.web")
+
+
+def _handler(body):
+    async def handler(request):
+        if isinstance(body, int):
+            return web.Response(status=body)
+        return web.Response(text=body)
+
+    return handler
+
+
+async def _serve(routes):
+
+    app = web.Application()
+    for path, body in routes.items():
+        app.router.add_get(path, _handler(body))
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    return runner, f"http://127.0.0.1:{port}/data"
+
+
+def test_async_get_data(monkeypatch, realtime_listing):
+    async def run():
+        runner, base_url = await _serve(
+            {
+                "/data/realtime2": realtime_listing,
+                "/data/realtime2/41013.txt": STANDARD_TXT,
+            }
+        )
+        monkeypatch.setattr(utils, "BASE_URL", base_url)
+
+        try:
+            async with AsyncNDBC() as ndbc:
+                df_avail = await ndbc.available_data(station_id="41013")
+                df = await ndbc.get_data("41013")
+                # listed, but missing on the server
+                df_missing = await ndbc.get_data("41025")
+        finally:
+            await runner.cleanup()
+
+        return df_avail, df, df_missing
+
+    df_avail, df, df_missing = asyncio.run(run())
+
+    assert len(df_avail) == 1
+    assert len(df) == 3
+    assert df.index.is_monotonic_increasing
+    assert df_missing.empty
+
+
+def test_async_missing_listings(monkeypatch, realtime_listing):
+    async def run():
+        # only realtime2 is served, every other listing is a 404
+        runner, base_url = await _serve({"/data/realtime2": realtime_listing})
+        monkeypatch.setattr(utils, "BASE_URL", base_url)
+
+        try:
+            async with AsyncNDBC(timeframe="historical") as ndbc:
+                return await ndbc.available_data(station_id="41013")
+        finally:
+            await runner.cleanup()
+
+    df_avail = asyncio.run(run())
+
+    assert list(df_avail["timeframe"]) == ["real_time"]
+
+
+def test_async_errors(monkeypatch):
+    async def run():
+        runner, base_url = await _serve({"/data/realtime2/41013.txt": 503})
+        monkeypatch.setattr(utils, "BASE_URL", base_url)
+
+        try:
+            async with AsyncNDBC() as ndbc:
+                with pytest.raises(utils.HTTPStatusError) as e:
+                    await ndbc._get_url(f"{base_url}/realtime2/41013.txt")
+                missing = await ndbc._get_url(f"{base_url}/realtime2/41025.txt")
+        finally:
+            await runner.cleanup()
+
+        return e.value, missing
+
+    metrics.stats.reset()
+    error, missing = asyncio.run(run())
+
+    assert error.status_code == 503
+    assert not missing
+    assert missing.url in utils.missing_urls()
+    assert metrics.stats.summary()["status_codes"] == {503: 1, 404: 1}
@@ -0,0 +1,205 @@
+import gzip
+from seebuoy.ndbc import historical, utils
+from seebuoy.ndbc.cache import DiskCache, NegativeCache, is_immutable
+from seebuoy.ndbc.transport import LocalTransport
+from conftest import HISTORICAL_TXT, FakeResponse, FakeSession
+
+
+def test_historical_never_refetched(tmp_path, monkeypatch):
+
+    session = FakeSession([FakeResponse(200, b"#YY MM DD")])
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    utils.configure_cache(tmp_path, ttl=0)
+
+    url = f"{utils.BASE_URL}/historical/stdmet/41002h1990.txt.gz"
+    try:
+        assert utils.get_url(url) == "#YY MM DD"
+        assert utils.get_url(url) == "#YY MM DD"
+    finally:
+        utils.configure_cache(None)
+
+    assert len(session.calls) == 1
+
+
+def test_historical_listings_expire():
+
+    viewer = (
+        f"{utils.VIEW_TEXT_URL}?filename=41002h1990.txt.gz&dir=data/historical/stdmet/"
+    )
+
+    assert is_immutable(f"{utils.BASE_URL}/historical/stdmet/41002h1990.txt.gz")
+    assert is_immutable(viewer)
+
+    # new yearly files are added to the listings
+    assert not is_immutable(f"{utils.BASE_URL}/historical/stdmet")
+    assert not is_immutable(f"{utils.BASE_URL}/historical/stdmet/")
+    assert not is_immutable(f"{utils.BASE_URL}/historical/")
+
+
+def test_revalidates_with_conditional_get(tmp_path, monkeypatch):
+
+    headers = {"ETag": '"abc"', "Last-Modified": "Tue, 03 Jan 2023 10:00:00 GMT"}
+    session = FakeSession([FakeResponse(200, b"listing", headers), FakeResponse(304)])
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    utils.configure_cache(tmp_path, ttl=0)
+
+    url = f"{utils.BASE_URL}/realtime2"
+    try:
+        utils.get_url(url)
+        assert utils.get_url(url) == "listing"
+    finally:
+        utils.configure_cache(None)
+
+    assert session.calls[1]["If-None-Match"] == '"abc"'
+
+
+def test_ttl(tmp_path):
+
+    cache = DiskCache(tmp_path, ttl=60)
+    entry = cache.store("https://example.com/a", b"body")
+
+    assert cache.load("https://example.com/a").body == b"body"
+    assert cache.is_fresh(entry)
+
+    entry.fetched_at -= 120
+    assert not cache.is_fresh(entry)
+
+
+def test_gzip_falls_back_to_viewer(monkeypatch):
+
+    session = FakeSession(
+        [FakeResponse(404), FakeResponse(200, HISTORICAL_TXT.encode())]
+    )
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+
+    df = historical.get_dataset(
+        "https://www.ndbc.noaa.gov/view_text_file.php?filename=41002h1990.txt.gz",
+        "standard",
+        gz_url=f"{utils.BASE_URL}/historical/stdmet/41002h1990.txt.gz",
+    )
+
+    assert len(df) == 2
+    assert len(session.calls) == 2
+
+
+def test_gzip_streamed_into_parser(tmp_path, monkeypatch):
+
+    body = gzip.compress(HISTORICAL_TXT.encode())
+    session = FakeSession([FakeResponse(200, body)])
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    utils.configure_cache(tmp_path, ttl=0)
+
+    txt_url = "https://www.ndbc.noaa.gov/view_text_file.php?filename=41013h2020.txt.gz"
+    gz_url = f"{utils.BASE_URL}/historical/stdmet/41013h2020.txt.gz"
+    try:
+        df = historical.get_dataset(txt_url, "standard", gz_url=gz_url)
+        # read back from the disk cache once streamed to the end
+        cached = historical.get_dataset(txt_url, "standard", gz_url=gz_url)
+    finally:
+        utils.configure_cache(None)
+
+    assert len(df) == 2
+    assert cached.equals(df)
+    assert len(session.calls) == 1
+
+
+def test_corrupt_gzip_falls_back_to_viewer(monkeypatch):
+
+    session = FakeSession(
+        [
+            FakeResponse(200, b"\x1f\x8bnot gzip"),
+            FakeResponse(200, HISTORICAL_TXT.encode()),
+        ]
+    )
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+
+    df = historical.get_dataset(
+        "https://www.ndbc.noaa.gov/view_text_file.php?filename=41013h2020.txt.gz",
+        "standard",
+        gz_url=f"{utils.BASE_URL}/historical/stdmet/41013h2020.txt.gz",
+    )
+
+    assert len(df) == 2
+    assert len(session.calls) == 2
+
+
+def test_negative_cache(tmp_path, monkeypatch):
+
+    session = FakeSession([FakeResponse(404)])
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    utils.configure_negative_cache(ttl=60, path=tmp_path / "missing.json")
+
+    url = f"{utils.BASE_URL}/historical/stdmet/00000h1990.txt.gz"
+    try:
+        first = utils.get_url(url)
+        second = utils.get_url(url)
+
+        # a new process reads the missing urls back from disk
+        utils.configure_negative_cache(ttl=60, path=tmp_path / "missing.json")
+        third = utils.get_url(url)
+    finally:
+        utils.configure_negative_cache()
+
+    assert not first and first.status_code == 404 and not first.cached
+    assert not second and second.cached
+    assert not third and third.cached
+    assert len(session.calls) == 1
+
+
+def test_negative_cache_shared_between_processes(tmp_path):
+
+    path = tmp_path / "missing.jsonl"
+    first = NegativeCache(ttl=60, path=path)
+    second = NegativeCache(ttl=60, path=path)
+
+    # neither overwrites the urls the other added
+    for i in range(100):
+        first.add(f"a{i}")
+        second.add(f"b{i}")
+    second.discard("b0")
+
+    # one line appended per change
+    assert len(path.read_text().splitlines()) == 201
+
+    third = NegativeCache(ttl=60, path=path)
+    assert "a0" in third and "b1" in third
+    assert "b0" not in third
+
+    # the superseded lines are dropped once read back
+    assert len(path.read_text().splitlines()) == 199
+
+    third.clear()
+    assert "a0" not in NegativeCache(ttl=60, path=path)
+
+
+def test_negative_cache_per_transport(tmp_path, monkeypatch):
+
+    session = FakeSession([FakeResponse(200, b"data")])
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+
+    # missing from an empty local mirror, which says nothing about NDBC
+    url = f"{utils.BASE_URL}/realtime2/41013.txt"
+    assert not utils.get_url(url, transport=LocalTransport(tmp_path))
+
+    assert utils.get_url(url) == "data"
+    assert len(session.calls) == 1
+
+
+def test_local_transport_not_cached(tmp_path, mirror, monkeypatch):
+
+    url = f"{utils.BASE_URL}/historical/stdmet/41013h2020.txt.gz"
+    session = FakeSession([FakeResponse(200, b"from NDBC")])
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+
+    utils.configure_cache(tmp_path / "cache")
+    try:
+        # the mirror's copy is not stored as NDBC's, and NDBC's copy is not
+        # served when the mirror was asked for
+        assert utils.get_url(url, transport=LocalTransport(mirror)) != "from NDBC"
+        assert utils.get_url(url) == "from NDBC"
+        txt = utils.get_url(url, transport=LocalTransport(mirror))
+    finally:
+        utils.configure_cache(None)
+
+    assert txt != "from NDBC"
+    assert len(session.calls) == 1
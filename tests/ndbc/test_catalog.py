@@ -0,0 +1,120 @@
+from datetime import datetime
+import pandas as pd
+import pytest
+from seebuoy import NDBC
+from seebuoy.ndbc import current_year
+from seebuoy.ndbc.catalog import Catalog
+from conftest import STANDARD_TXT, CountingTransport
+
+
+def test_catalog_answers_locally(mirror, tmp_path_factory):
+
+    catalog_dir = tmp_path_factory.mktemp("catalog")
+    transport = CountingTransport(mirror)
+
+    ndbc = NDBC(timeframe="historical", transport=transport, catalog=str(catalog_dir))
+    df_avail = ndbc.available_data(station_id="41013")
+    n_listings = len(transport.gets)
+
+    assert list(df_avail["timeframe"]) == ["real_time", "historical"]
+    assert list(df_avail["file_year"].isna()) == [True, False]
+    assert df_avail["file_year"].iloc[1] == 2020
+
+    # a new process reads the same catalog without downloading any listing
+    ndbc = NDBC(timeframe="historical", transport=transport, catalog=str(catalog_dir))
+    df = ndbc.get_data("41013")
+    assert len(transport.gets) == n_listings + 2
+    assert len(df) == 5
+
+
+def test_catalog_merges_changed_rows(tmp_path):
+
+    catalog = Catalog(tmp_path)
+    df = pd.DataFrame(
+        {
+            "url": ["stdmet/Jan/a.txt.gz", "stdmet/Feb/b.txt.gz"],
+            "last_modified": ["2023-02-01 10:00", "2023-03-01 10:00"],
+            "size": ["1.2K", "3.4K"],
+            "dataset": "standard",
+        }
+    )
+
+    assert catalog.store("current_year", "standard", df) == 2
+    assert catalog.store("current_year", "standard", df) == 0
+
+    # only the Feb listing was downloaded again: b grew and c appeared
+    df_feb = pd.DataFrame(
+        {
+            "url": ["stdmet/Feb/b.txt.gz", "stdmet/Feb/c.txt.gz"],
+            "last_modified": ["2023-03-02 10:00", "2023-03-02 10:00"],
+            "size": ["3.9K", "0.5K"],
+            "dataset": "standard",
+        }
+    )
+    n_changed = catalog.store(
+        "current_year", "standard", df_feb, prefixes=["stdmet/Feb/"]
+    )
+    df = catalog.load("current_year", "standard")
+
+    assert n_changed == 2
+    assert sorted(df["url"]) == [
+        "stdmet/Feb/b.txt.gz",
+        "stdmet/Feb/c.txt.gz",
+        "stdmet/Jan/a.txt.gz",
+    ]
+    assert df.set_index("url").loc["stdmet/Feb/b.txt.gz", "size"] == "3.9K"
+
+
+def test_refresh_catalog_only_current_months(mirror, tmp_path_factory):
+
+    transport = CountingTransport(mirror)
+    catalog = Catalog(tmp_path_factory.mktemp("catalog"), ttl=0)
+    ndbc = NDBC(timeframe="historical", transport=transport, catalog=catalog)
+
+    ndbc.available_data()
+    transport.gets.clear()
+
+    month = list(current_year.MONTHS)[datetime.utcnow().month - 1]
+    (mirror / "stdmet" / month / "41013.txt").write_text(STANDARD_TXT)
+
+    # realtime2 and at most two monthly folders, no historical listing
+    assert ndbc.refresh_catalog() == 1
+    assert 2 <= len(transport.gets) <= 3
+    assert not any("historical" in url for url in transport.gets)
+
+    df = catalog.load("current_year", "standard", station_id="41013")
+    assert list(df["url"]) == [f"stdmet/{month}/41013.txt"]
+
+
+def test_changed_months():
+
+    since = datetime(2023, 5, 20)
+    assert current_year.changed_months(since, now=datetime(2023, 5, 21)) == [
+        "Apr",
+        "May",
+    ]
+    assert current_year.changed_months(since, now=datetime(2023, 7, 1)) == [
+        "Apr",
+        "May",
+        "Jun",
+        "Jul",
+    ]
+    assert current_year.changed_months(since, now=datetime(2024, 1, 2)) is None
+
+    # Dec is gzipped a few days into January
+    since = datetime(2024, 1, 3)
+    assert current_year.changed_months(since, now=datetime(2024, 1, 6)) == [
+        "Dec",
+        "Jan",
+    ]
+
+
+def test_failed_background_refresh_warns(tmp_path):
+
+    catalog = Catalog(tmp_path)
+
+    def fetch():
+        raise ConnectionError("NDBC is down")
+
+    with pytest.warns(RuntimeWarning, match="NDBC is down"):
+        catalog.refresh_in_background("historical", "standard", fetch).join()
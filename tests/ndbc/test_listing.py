@@ -0,0 +1,90 @@
+import pandas as pd
+from seebuoy.ndbc import current_year, historical, utils
+from seebuoy.ndbc.listing import parse_listing
+from conftest import make_listing
+
+PRE_LISTING = """\
+<html><body><h1>Index of /data/realtime2</h1><pre>\
+<img src="/icons/blank.gif" alt="Icon "> <a href="?C=N;O=D">Name</a>  \
+<a href="?C=M;O=A">Last modified</a>      <a href="?C=S;O=A">Size</a>
+<hr><img src="/icons/back.gif" alt="[PARENTDIR]"> <a href="/data/">Parent Directory</a>   -
+<img src="/icons/text.gif" alt="[TXT]"> <a href="41013.txt">41013.txt</a>   2023-01-05 13:05  1.1M
+<img src="/icons/folder.gif" alt="[DIR]"> <a href="old/">old/</a>   2022-12-01 08:00    -
+<hr></pre></body></html>
+"""
+
+
+def test_matches_read_html():
+
+    txt = make_listing(
+        [
+            ("41013.spec", "2023-01-05 13:05", "12K"),
+            ("41013.txt", "2023-01-05 13:05", "1.1M"),
+            ("a&amp;b.txt", "2023-01-05 13:01", "512"),
+            ("sub/", "2022-12-01 08:00", "-"),
+        ]
+    )
+
+    df = parse_listing(txt)
+
+    expected = pd.read_html(txt)[0].dropna(subset=["Last modified"])
+    assert list(df["file_name"]) == list(expected["Name"])
+    assert list(df["last_modified"]) == list(expected["Last modified"])
+    assert list(df["size"]) == list(expected["Size"])
+    assert df["description"].isna().all()
+
+
+def test_pre_listing():
+
+    df = parse_listing(PRE_LISTING)
+
+    assert list(df["file_name"]) == ["41013.txt", "old/"]
+    assert list(df["size"]) == ["1.1M", "-"]
+
+
+def test_empty_listing():
+
+    df = parse_listing(make_listing([]))
+
+    assert df.empty
+    assert list(df.columns) == ["file_name", "last_modified", "size", "description"]
+
+
+def test_current_year_month():
+
+    gz = make_listing([("4101312023.txt.gz", "2023-02-01 10:00", "12K")])
+    df = current_year.parse_avail_current_year_month(gz, "standard", "Jan")
+
+    row = df.iloc[0]
+    assert row["station_id"] == "41013"
+    assert row["txt_url"] == (
+        "https://www.ndbc.noaa.gov/view_text_file.php"
+        "?filename=4101312023.txt.gz&dir=data/stdmet/Jan/"
+    )
+    assert row["gz_url"] == f"{utils.BASE_URL}/stdmet/Jan/4101312023.txt.gz"
+
+    txt = make_listing([("41013.txt", "2023-03-01 10:00", "12K")])
+    df = current_year.parse_avail_current_year_month(txt, "standard", "Mar")
+
+    assert list(df["station_id"]) == ["41013"]
+    assert list(df["txt_url"]) == [f"{utils.BASE_URL}/stdmet/Mar/41013.txt"]
+
+
+def test_historical():
+
+    txt = make_listing(
+        [
+            ("41013h2019.txt.gz", "2020-02-01 10:00", "310K"),
+            ("41013h2020.txt.gz", "2021-02-01 10:00", "305K"),
+        ]
+    )
+    df = historical.parse_avail_historical(txt, "standard")
+
+    assert list(df["station_id"]) == ["41013", "41013"]
+    assert list(df["file_year"]) == [2019, 2020]
+    assert df["file_year"].dtype == "Int64"
+    assert df["dataset"].dtype == "category"
+    assert df["txt_url"].iloc[1] == (
+        "https://www.ndbc.noaa.gov/view_text_file.php"
+        "?filename=41013h2020.txt.gz&dir=data/historical/stdmet/"
+    )
@@ -0,0 +1,81 @@
+import gzip
+import pytest
+from seebuoy import NDBC
+from seebuoy.ndbc import metrics, utils
+from seebuoy.ndbc.transport import LocalTransport
+from conftest import HISTORICAL_TXT, STANDARD_TXT, CountingTransport
+
+
+def test_request_events(tmp_path):
+
+    (tmp_path / "realtime2").mkdir()
+    (tmp_path / "realtime2" / "41013.txt").write_text(STANDARD_TXT)
+    (tmp_path / "historical" / "stdmet").mkdir(parents=True)
+    gz_path = tmp_path / "historical" / "stdmet" / "41013h2020.txt.gz"
+    gz_path.write_bytes(gzip.compress(HISTORICAL_TXT.encode()))
+
+    events = []
+    metrics.add_callback(events.append)
+    metrics.stats.reset()
+    try:
+        ndbc = NDBC(timeframe="historical_only", transport=LocalTransport(tmp_path))
+        ndbc.available_data()
+        ndbc.get_data("41013")
+        utils.get_url(f"{utils.BASE_URL}/realtime2/41013.txt", LocalTransport(tmp_path))
+    finally:
+        metrics.remove_callback(events.append)
+
+    listing, data, realtime = events
+    assert listing.url == f"{utils.BASE_URL}/historical/stdmet"
+    assert data.url.endswith("41013h2020.txt.gz")
+    assert data.n_bytes == gz_path.stat().st_size
+    assert data.status_code == 200 and data.cache == "miss"
+    assert data.ttfb is not None and data.elapsed >= data.ttfb
+    assert realtime.n_bytes == len(STANDARD_TXT)
+
+    summary = metrics.stats.summary()
+    assert summary["requests"] == 3
+    assert summary["status_codes"] == {200: 3}
+    assert summary["files_parsed"] == 1
+
+
+def test_errors_and_cache_hits(tmp_path):
+
+    metrics.stats.reset()
+    utils.configure_cache(tmp_path / "cache")
+    try:
+        url = f"{utils.BASE_URL}/realtime2/41013.txt"
+        (tmp_path / "realtime2").mkdir()
+        (tmp_path / "realtime2" / "41013.txt").write_text(STANDARD_TXT)
+        transport = CountingTransport(tmp_path)
+        utils.get_url(url, transport)
+        utils.get_url(url, transport)
+
+        utils.get_url(f"{utils.BASE_URL}/realtime2/00000.txt", transport)
+    finally:
+        utils.configure_cache(None)
+        utils.configure_negative_cache()
+
+    summary = metrics.stats.summary()
+    assert summary["cache_misses"] == 2
+    assert summary["cache_hits"] == 1
+    assert summary["status_codes"] == {200: 1, 404: 1}
+
+
+def test_failing_callback_does_not_fail_request(tmp_path):
+    def fail(event):
+        raise KeyError("statsd is down")
+
+    (tmp_path / "realtime2").mkdir()
+    (tmp_path / "realtime2" / "41013.txt").write_text(STANDARD_TXT)
+
+    metrics.add_callback(fail)
+    try:
+        with pytest.warns(RuntimeWarning, match="statsd is down"):
+            txt = utils.get_url(
+                f"{utils.BASE_URL}/realtime2/41013.txt", LocalTransport(tmp_path)
+            )
+    finally:
+        metrics.remove_callback(fail)
+
+    assert txt == STANDARD_TXT
@@ -0,0 +1,23 @@
+from seebuoy.ndbc import mirror
+from seebuoy.ndbc.transport import LocalTransport
+from conftest import STANDARD_TXT
+
+
+def test_sync_only_downloads_changes(tmp_path):
+
+    source = tmp_path / "ndbc"
+    (source / "realtime2").mkdir(parents=True)
+    (source / "realtime2" / "41013.txt").write_text(STANDARD_TXT)
+    (source / "realtime2" / "41025.txt").write_text(STANDARD_TXT)
+
+    dest = tmp_path / "mirror"
+    transport = LocalTransport(source)
+
+    df = mirror.sync(dest, ["realtime2"], transport=transport)
+    assert sorted(df["file_name"]) == ["41013.txt", "41025.txt"]
+    assert (dest / "realtime2" / "41013.txt").read_text() == STANDARD_TXT
+
+    (source / "realtime2" / "41025.txt").write_text(STANDARD_TXT * 2)
+
+    df = mirror.sync(dest, ["realtime2"], transport=transport)
+    assert list(df["file_name"]) == ["41025.txt"]
@@ -0,0 +1,95 @@
+import gzip
+import threading
+import time
+from seebuoy.ndbc import utils
+from seebuoy.ndbc.ratelimit import RateLimiter
+from seebuoy.ndbc.transport import LocalTransport
+
+
+def test_rate_limit():
+
+    limiter = RateLimiter(rate=20, burst=1)
+
+    start = time.time()
+    for _ in range(5):
+        limiter.wait_for_token()
+
+    assert time.time() - start >= 0.19
+
+
+def test_rate_limit_shared_between_processes(tmp_path):
+
+    # two limiters on the same lock_dir behave like two processes
+    limiters = [RateLimiter(rate=20, burst=1, lock_dir=tmp_path) for _ in range(2)]
+
+    start = time.time()
+    for _ in range(3):
+        for limiter in limiters:
+            limiter.wait_for_token()
+
+    assert time.time() - start >= 0.24
+
+
+def test_try_limit(tmp_path):
+
+    limiter = RateLimiter(rate=1, burst=1)
+    with limiter.try_limit() as allowed:
+        assert allowed
+    with limiter.try_limit() as allowed:
+        assert not allowed
+
+    # two limiters on the same lock_dir behave like two processes
+    limiters = [RateLimiter(max_connections=1, lock_dir=tmp_path) for _ in range(2)]
+    with limiters[0].limit():
+        with limiters[1].try_limit() as allowed:
+            assert not allowed
+    with limiters[1].try_limit() as allowed:
+        assert allowed
+
+
+def test_max_connections():
+
+    utils.configure_rate_limit(max_connections=2)
+    active = []
+    peak = []
+
+    def request(_):
+        with utils.limited():
+            active.append(1)
+            peak.append(len(active))
+            time.sleep(0.02)
+            active.pop()
+
+    try:
+        utils.map_concurrent(request, range(8), max_workers=8)
+    finally:
+        utils.configure_rate_limit()
+
+    assert max(peak) <= 2
+
+
+def test_gzip_stream_holds_connection(tmp_path):
+
+    path = tmp_path / "historical" / "stdmet" / "41013h2020.txt.gz"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(gzip.compress(b"#YY MM DD\n"))
+
+    transport = LocalTransport(tmp_path)
+    url = f"{utils.BASE_URL}/historical/stdmet/41013h2020.txt.gz"
+    utils.configure_rate_limit(max_connections=1)
+    try:
+        f = utils.open_gzip_url(url, transport=transport)
+
+        # the first stream is still being read, so the second waits for it
+        second = threading.Thread(
+            target=lambda: utils.open_gzip_url(url, transport=transport).close()
+        )
+        second.start()
+        second.join(0.2)
+        assert second.is_alive()
+
+        f.close()
+        second.join(5)
+        assert not second.is_alive()
+    finally:
+        utils.configure_rate_limit()
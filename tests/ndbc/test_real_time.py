@@ -0,0 +1,77 @@
+import pandas as pd
+from seebuoy.ndbc import real_time, utils
+from conftest import STANDARD_TXT
+
+
+class RangeResponse:
+    def __init__(self, body, n_bytes, total=None):
+        self.status_code = 206
+        self.text = body[:n_bytes]
+        self.content = self.text.encode()
+        total = len(body) if total is None else total
+        self.headers = {"Content-Range": f"bytes 0-{n_bytes - 1}/{total}"}
+
+
+class RangeSession:
+    def __init__(self, body, total=None):
+        self.body = body
+        self.total = total
+        self.ranges = []
+        self.full = 0
+
+    def get(self, url, headers=None, **kwargs):
+        if not headers or "Range" not in headers:
+            self.full += 1
+            resp = RangeResponse(self.body, len(self.body))
+            resp.status_code = 200
+            return resp
+
+        n_bytes = int(headers["Range"].split("-")[1]) + 1
+        self.ranges.append(n_bytes)
+        return RangeResponse(self.body, n_bytes, self.total)
+
+
+def test_get_dataset_since(monkeypatch):
+
+    session = RangeSession(STANDARD_TXT)
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    monkeypatch.setattr(real_time, "HEAD_SIZE", 200)
+
+    since = pd.Timestamp("2023-01-05 12:40")
+    df = real_time.get_dataset("realtime2/41013.txt", "standard", since=since)
+
+    assert list(df.index) == [
+        pd.Timestamp("2023-01-05 12:50"),
+        pd.Timestamp("2023-01-05 12:40"),
+    ]
+    assert session.ranges == [200, 400]
+
+
+def test_get_recent_text_unknown_length(monkeypatch):
+
+    session = RangeSession(STANDARD_TXT, total="*")
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+
+    # since is before the first row, so the range never reaches it, and the
+    # short read tells the whole file was returned
+    since = pd.Timestamp("2020-01-01")
+    txt = real_time.get_recent_text("realtime2/41013.txt", since, head_size=200)
+
+    assert txt == STANDARD_TXT
+    assert session.ranges[-1] > len(STANDARD_TXT) > session.ranges[-2]
+
+
+def test_get_recent_text_gives_up(monkeypatch):
+
+    # a server that always fills the range and never says how long the file is
+    body = STANDARD_TXT * 100
+    session = RangeSession(body, total="*")
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    monkeypatch.setattr(real_time, "MAX_DOUBLINGS", 2)
+
+    since = pd.Timestamp("2020-01-01")
+    txt = real_time.get_recent_text("realtime2/41013.txt", since, head_size=100)
+
+    assert session.ranges == [100, 200, 400]
+    assert session.full == 1
+    assert txt == body
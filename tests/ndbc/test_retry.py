@@ -0,0 +1,139 @@
+import pytest
+import requests
+from seebuoy.ndbc import utils
+from seebuoy.ndbc.transport import LocalTransport
+from seebuoy.ndbc.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    parse_retry_after,
+)
+from conftest import FakeResponse, FakeSession
+
+URL = f"{utils.BASE_URL}/realtime2/41013.txt"
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(utils.time, "sleep", sleeps.append)
+    yield sleeps
+    utils.configure_retries()
+
+
+def test_retries_transient_errors(monkeypatch, sleeps):
+
+    session = FakeSession(
+        [
+            FakeResponse(503, headers={"Retry-After": "7"}),
+            FakeResponse(502),
+            FakeResponse(200, b"data"),
+        ]
+    )
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    utils.configure_retries(retries=2, backoff=1)
+
+    assert utils.get_url(URL) == "data"
+    assert sleeps[0] == 7
+    assert 0 <= sleeps[1] <= 2
+
+
+def test_gives_up_after_retries(monkeypatch, sleeps):
+
+    session = FakeSession([FakeResponse(503), FakeResponse(503), FakeResponse(403)])
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    utils.configure_retries(retries=1)
+
+    with pytest.raises(utils.HTTPStatusError) as e:
+        utils.get_url(URL)
+    assert e.value.status_code == 503
+    assert len(session.calls) == 2
+
+    # other errors are not retried
+    with pytest.raises(utils.HTTPStatusError) as e:
+        utils.get_url(URL)
+    assert e.value.status_code == 403
+
+
+def test_retry_policy():
+
+    policy = RetryPolicy(retries=3, backoff=1, max_backoff=5)
+    timeout = requests.Timeout()
+
+    assert all(0 <= policy.delay(timeout, 2) <= 4 for _ in range(20))
+    assert policy.delay(timeout, 3) is None
+    assert policy.delay(KeyError(), 0) is None
+
+    error = utils.HTTPStatusError(URL, 503, retry_after="60")
+    assert policy.delay(error, 0) is None
+
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+
+
+def test_circuit_breaker(monkeypatch, sleeps):
+
+    session = FakeSession([FakeResponse(503)] * 3 + [FakeResponse(200, b"data")])
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    utils.configure_retries(retries=0, failure_threshold=3, reset_timeout=0.2)
+
+    for _ in range(3):
+        with pytest.raises(utils.HTTPStatusError):
+            utils.get_url(URL)
+
+    # NDBC is down, so no request is made
+    with pytest.raises(CircuitOpenError):
+        utils.get_url(URL)
+    assert len(session.calls) == 3
+
+    breaker = utils._breaker
+    breaker._hosts["www.ndbc.noaa.gov"][1] -= 1
+    assert utils.get_url(URL) == "data"
+    assert not breaker.is_open("www.ndbc.noaa.gov")
+
+
+def test_circuit_breaker_trial_not_transient(monkeypatch, sleeps):
+
+    session = FakeSession(
+        [FakeResponse(503), FakeResponse(403), FakeResponse(200, b"data")]
+    )
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    utils.configure_retries(retries=0, failure_threshold=1, reset_timeout=0)
+
+    with pytest.raises(utils.HTTPStatusError):
+        utils.get_url(URL)
+
+    # the trial gets a 403, which says nothing about NDBC being down, and
+    # the next request is let through as a new trial
+    with pytest.raises(utils.HTTPStatusError):
+        utils.get_url(URL)
+    assert utils.get_url(URL) == "data"
+    assert len(session.calls) == 3
+
+
+def test_circuit_breaker_single_trial():
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure("host")
+
+    breaker.before("host")
+    with pytest.raises(CircuitOpenError):
+        breaker.before("host")
+
+    breaker.record_failure("host")
+    assert breaker.is_open("host")
+
+
+def test_circuit_breaker_skips_local_transport(monkeypatch, sleeps, mirror):
+
+    session = FakeSession([FakeResponse(503)])
+    monkeypatch.setattr(utils, "get_transport", lambda: session)
+    utils.configure_retries(retries=0, failure_threshold=1, reset_timeout=60)
+
+    with pytest.raises(utils.HTTPStatusError):
+        utils.get_url(URL)
+    with pytest.raises(CircuitOpenError):
+        utils.get_url(URL)
+
+    # NDBC is down, but the mirror is not
+    assert utils.get_url(URL, transport=LocalTransport(mirror)).startswith("#YY")
@@ -0,0 +1,337 @@
+import gzip
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+import pytest
+from seebuoy import NDBC
+from seebuoy.ndbc import current_year, historical
+from seebuoy.ndbc import utils
+from seebuoy.ndbc.adaptive import AdaptiveLimit
+from seebuoy.ndbc.ratelimit import RateLimiter
+from seebuoy.ndbc.transport import (
+    FixtureTransport,
+    HedgedTransport,
+    LocalTransport,
+    Response,
+    Transport,
+)
+from conftest import HISTORICAL_TXT, STANDARD_TXT, CountingTransport
+
+
+def test_local_transport(mirror):
+
+    ndbc = NDBC(timeframe="historical", transport=LocalTransport(mirror))
+    df_avail = ndbc.available_data(station_id="41013")
+    df = ndbc.get_data("41013")
+
+    assert list(df_avail["timeframe"]) == ["real_time", "historical"]
+    assert len(df) == 5
+
+
+def test_get_data_nothing_to_return(mirror):
+
+    ndbc = NDBC(timeframe="historical_only", transport=LocalTransport(mirror))
+    ndbc.available_data()
+
+    # the only file is from 2020
+    assert ndbc.get_data("41013", last_n_hours=6).empty
+    assert ndbc.get_data("00000").empty
+
+
+def test_all_listings_missing(tmp_path):
+
+    # a partial mirror without the current year's month folders
+    for timeframe in ["current_year_only", "historical_only"]:
+        ndbc = NDBC(timeframe=timeframe, transport=LocalTransport(tmp_path))
+        df_avail = ndbc.available_data(station_id="41013")
+
+        assert df_avail.empty
+        assert "txt_url" in df_avail.columns
+        assert ndbc.get_data("41013").empty
+
+
+def test_local_transport_viewer_and_404(mirror):
+
+    transport = LocalTransport(mirror)
+    url = (
+        "https://www.ndbc.noaa.gov/view_text_file.php"
+        "?filename=41013h2020.txt.gz&dir=data/historical/stdmet/"
+    )
+
+    assert transport.get(url).text == HISTORICAL_TXT
+    assert transport.get("https://www.ndbc.noaa.gov/data/nope").status_code == 404
+
+
+def test_fixture_transport(mirror, tmp_path_factory):
+
+    fixture_dir = tmp_path_factory.mktemp("fixtures")
+    url = "https://www.ndbc.noaa.gov/data/realtime2/41013.txt"
+
+    recorder = FixtureTransport(fixture_dir, record_from=LocalTransport(mirror))
+    assert recorder.get(url).text == STANDARD_TXT
+
+    replay = FixtureTransport(fixture_dir)
+    assert replay.get(url).text == STANDARD_TXT
+    with pytest.raises(LookupError):
+        replay.get("https://www.ndbc.noaa.gov/data/realtime2/41025.txt")
+
+
+class StallingTransport(Transport):
+    """Answers immediately, except the first request for `slow_url` which
+    stalls until released."""
+
+    def __init__(self, slow_url):
+        self.slow_url = slow_url
+        self.release = threading.Event()
+        self.calls = []
+        self.closed = []
+
+    def get(self, url, headers=None, stream=False):
+        self.calls.append(url)
+        resp = Response(url, 200, f"call {len(self.calls)}".encode())
+        resp.close = lambda: self.closed.append(resp)
+
+        if url == self.slow_url and self.calls.count(url) == 1:
+            self.release.wait(5)
+        return resp
+
+
+def test_hedged_transport():
+
+    inner = StallingTransport("slow")
+    transport = HedgedTransport(inner, percentile=90, budget=0.5, min_samples=5)
+
+    for _ in range(10):
+        assert transport.get("fast").status_code == 200
+    assert transport.threshold() is not None
+
+    # the duplicate answers while the first request is stalled
+    resp = transport.get("slow")
+    assert resp.text == "call 12"
+    assert transport.hedged == 1
+
+    # the stalled response is closed once it arrives
+    inner.release.set()
+    transport._executor.shutdown(wait=True)
+    assert inner.calls.count("slow") == 2
+    assert inner.closed[0].text == "call 11"
+
+
+def test_hedging_budget():
+
+    inner = StallingTransport("slow")
+    transport = HedgedTransport(inner, budget=0.01, min_samples=5)
+
+    for _ in range(10):
+        transport.get("fast")
+
+    inner.release.set()
+    assert transport.get("slow").text == "call 11"
+    assert transport.hedged == 0
+
+
+def test_hedge_takes_rate_limit_slot():
+
+    limiter = RateLimiter(max_connections=1)
+    inner = StallingTransport("slow")
+    transport = HedgedTransport(
+        inner, percentile=90, budget=0.5, min_samples=5, limit=limiter.try_limit
+    )
+
+    for _ in range(10):
+        transport.get("fast")
+
+    # the only connection is taken, so the slow request is not duplicated
+    with limiter.limit():
+        threading.Timer(0.2, inner.release.set).start()
+        assert transport.get("slow").text == "call 11"
+    assert transport.hedged == 0
+
+    # with a free connection it is, and the connection is given back after
+    inner.slow_url = "slow 2"
+    inner.release.clear()
+    assert transport.get("slow 2").text == "call 13"
+    assert transport.hedged == 1
+    with limiter.try_limit() as allowed:
+        assert allowed
+
+    inner.release.set()
+
+
+def test_configure_hedging(monkeypatch):
+
+    monkeypatch.setattr(utils, "_transport", None)
+    utils.configure_hedging(percentile=99, budget=0.1)
+    try:
+        transport = utils.get_transport()
+        assert isinstance(transport, HedgedTransport)
+        assert transport.percentile == 99
+        assert utils.get_session() is transport.inner.session
+    finally:
+        utils.configure_hedging(percentile=None)
+
+    assert not isinstance(utils.get_transport(), HedgedTransport)
+
+
+def test_refresh_if_changed(mirror, tmp_path_factory):
+
+    transport = CountingTransport(mirror)
+    ndbc = NDBC(transport=transport)
+    utils.configure_cache(tmp_path_factory.mktemp("cache"), ttl=0)
+    try:
+        ndbc.available_data()
+        ndbc.get_data("41013")
+        assert len(transport.gets) == 2
+
+        # the file did not change, so only a HEAD request is made for it.
+        # listings have no Last-Modified and are downloaded again once the
+        # ttl expired
+        ndbc.available_data(refresh="if-changed")
+        df = ndbc.get_data("41013", refresh="if-changed")
+        assert len(transport.gets) == 3
+        assert transport.heads == [f"{utils.BASE_URL}/realtime2/41013.txt"]
+        assert len(df) == 3
+
+        with open(mirror / "realtime2" / "41013.txt", "a") as f:
+            f.write(STANDARD_TXT.splitlines()[-1] + "\n")
+        ndbc.get_data("41013", refresh="if-changed")
+        assert len(transport.gets) == 4
+    finally:
+        utils.configure_cache(None)
+
+    with pytest.raises(ValueError):
+        ndbc.get_data("41013", refresh="always")
+
+
+def test_refresh_if_changed_keeps_ttl(mirror, tmp_path_factory):
+
+    transport = CountingTransport(mirror)
+    ndbc = NDBC(transport=transport)
+    utils.configure_cache(tmp_path_factory.mktemp("cache"), ttl=3600)
+    try:
+        ndbc.available_data()
+        assert len(transport.gets) == 1
+
+        # the listing has no validators, so it is served from the cache
+        # until the ttl expires
+        ndbc.available_data(refresh="if-changed")
+        assert len(transport.gets) == 1
+        assert transport.heads == []
+    finally:
+        utils.configure_cache(None)
+
+
+class ConcurrencyTransport(LocalTransport):
+    def __init__(self, root):
+        super().__init__(root)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def get(self, url, headers=None, stream=False):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        return super().get(url, headers=headers, stream=stream)
+
+
+def test_listings_fetched_concurrently(mirror, monkeypatch):
+
+    # start from a fresh adaptive limit, unaffected by earlier tests
+    monkeypatch.setattr(utils, "_adaptive", AdaptiveLimit(initial=4))
+
+    for month, code in [("Jan", "1"), ("Feb", "2")]:
+        path = mirror / "stdmet" / month / f"41013{code}2023.txt.gz"
+        path.write_bytes(gzip.compress(HISTORICAL_TXT.encode()))
+    (mirror / "stdmet" / "Mar" / "41013.txt").write_text(HISTORICAL_TXT)
+
+    transport = ConcurrencyTransport(mirror)
+    ndbc = NDBC(timeframe="current_year_only", transport=transport)
+    df = ndbc.available_data(dataset="all")
+    df_serial = ndbc.available_data(dataset="all", max_workers=1)
+
+    assert transport.peak > 1
+    assert list(df["url"]) == [
+        "stdmet/Jan/4101312023.txt.gz",
+        "stdmet/Feb/4101322023.txt.gz",
+        "stdmet/Mar/41013.txt",
+    ]
+    assert list(df["url"]) == list(df_serial["url"])
+
+
+def test_probe_station_files(mirror):
+
+    now = datetime.utcnow()
+    month = list(current_year.MONTHS)[now.month - 1]
+    (mirror / "stdmet" / month / "41013.txt").write_text(STANDARD_TXT)
+
+    transport = CountingTransport(mirror)
+    ndbc = NDBC(timeframe="historical", transport=transport)
+    df_probe = ndbc.available_data(station_id="41013", probe=True)
+
+    # only HEAD requests for the station's own files, no listing
+    assert transport.gets == []
+    assert all("41013" in url for url in transport.heads)
+
+    df = ndbc.available_data(station_id="41013")
+    pd.testing.assert_frame_equal(
+        df_probe.reset_index(drop=True), df.reset_index(drop=True)
+    )
+
+    with pytest.raises(ValueError):
+        ndbc.available_data(probe=True)
+
+
+def test_probe_unknown_file_names_uses_listing(mirror):
+
+    (mirror / "historical" / "wlevel").mkdir()
+    for name in ["41013l2020.txt.gz", "41002l2020.txt.gz"]:
+        path = mirror / "historical" / "wlevel" / name
+        path.write_bytes(gzip.compress(HISTORICAL_TXT.encode()))
+
+    transport = CountingTransport(mirror)
+    ndbc = NDBC(timeframe="historical", transport=transport)
+    df = ndbc.available_data(dataset="tide", station_id="41013", probe=True)
+
+    # the other timeframes are still probed
+    assert list(df["station_id"]) == ["41013"]
+    assert transport.heads
+    assert all("historical" not in url for url in transport.heads)
+
+
+def test_probe_stops_after_missing_years(mirror):
+
+    for year in [2016, 2018]:
+        path = mirror / "historical" / "stdmet" / f"41013h{year}.txt.gz"
+        path.write_bytes(gzip.compress(HISTORICAL_TXT.encode()))
+
+    transport = CountingTransport(mirror)
+    df = historical.avail_station_historical(
+        "41013", transport=transport, years=range(2000, 2024), max_misses=4
+    )
+
+    # 2023-2020, 2019-2016, then 2015-2012 had no file
+    assert list(df["file_year"]) == [2016, 2018, 2020]
+    assert len(transport.heads) == 12
+
+    df = current_year.avail_station_current_year(
+        "41013", transport=transport, now=datetime(2023, 3, 2), max_misses=2
+    )
+    assert df.empty
+    # Mar, then Feb (gzipped or not)
+    assert len(transport.heads) == 15
+
+
+def test_current_year_station_urls():
+
+    urls = current_year.station_urls("41013", "standard", now=datetime(2023, 3, 2))
+    base = utils.BASE_URL + "/stdmet"
+
+    assert urls["Jan"] == [f"{base}/Jan/4101312023.txt.gz"]
+    assert urls["Feb"] == [f"{base}/Feb/4101322023.txt.gz", f"{base}/Feb/41013.txt"]
+    assert urls["Mar"] == [f"{base}/Mar/41013.txt"]
+    assert urls["Dec"] == [f"{base}/Dec/41013c2022.txt.gz"]
@@ -0,0 +1,75 @@
+import gzip
+import time
+import pytest
+from seebuoy.ndbc import utils
+
+
+@pytest.fixture
+def session_settings():
+    """Restore the shared session's settings after the test."""
+
+    settings = utils.POOL_SIZE, utils.KEEP_ALIVE, utils.TIMEOUT
+    yield
+    pool_size, keep_alive, timeout = settings
+    utils.configure_session(pool_size=pool_size, keep_alive=keep_alive, timeout=timeout)
+
+
+def test_session_is_shared(session_settings):
+
+    utils.configure_session(pool_size=4)
+    session = utils.get_session()
+
+    assert utils.get_session() is session
+    assert session.get_adapter(utils.BASE_URL)._pool_maxsize == 4
+
+
+def test_configure_session_rebuilds(session_settings):
+
+    session = utils.get_session()
+    utils.configure_session(keep_alive=False)
+    new_session = utils.get_session()
+
+    assert new_session is not session
+    assert new_session.headers["Connection"] == "close"
+
+
+def test_map_concurrent_keeps_order():
+    def slow_square(x):
+        time.sleep(0.01 * (5 - x))
+        return x * x
+
+    assert utils.map_concurrent(slow_square, range(5), max_workers=5) == [
+        0,
+        1,
+        4,
+        9,
+        16,
+    ]
+    assert utils.map_concurrent(slow_square, [], max_workers=5) == []
+
+
+def test_gunzip_chunks():
+
+    data = gzip.compress(b"#YY MM DD\n") + gzip.compress(b"2020 01 01\n")
+    chunks = [data[i : i + 7] for i in range(0, len(data), 7)]
+
+    assert b"".join(utils.gunzip_chunks(chunks)) == b"#YY MM DD\n2020 01 01\n"
+    assert b"".join(utils.gunzip_chunks([b"plain ", b"text"])) == b"plain text"
+
+
+def test_single_flight_coalesces():
+
+    flights = utils.SingleFlight()
+    calls = []
+
+    def download():
+        calls.append(1)
+        time.sleep(0.1)
+        return "txt"
+
+    results = utils.map_concurrent(
+        lambda _: flights.do("url", download), range(5), max_workers=5
+    )
+
+    assert results == ["txt"] * 5
+    assert len(calls) == 1